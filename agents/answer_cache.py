@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from config import Config
+from utils.text_vectors import HashingVectorizer
+from utils.vocabulary import NEGATION_RE, extract_terms, extract_timeframes
+
+# Слова-ссылки на предыдущий контекст разговора
+_CONTEXT_MARKERS = re.compile(
+    r"\b(это|этот|эта|эти|этого|этой|его|её|ее|их|них|ним|там|выше|ранее|тоже|также|"
+    r"подробнее|продолжи|продолжай|ещё|еще|предыдущ\w*|последн\w*|"
+    r"it|this|that|these|those|above|previous|more)\b",
+    re.IGNORECASE | re.UNICODE
+)
+
+# Синонимы, которые приводятся к одной форме перед векторизацией
+_SYNONYMS = [
+    (re.compile(r"\b(интрадей\w*|внутридневн\w*|intraday|day\s+trading)\b", re.IGNORECASE), "дневной торговли"),
+    (re.compile(r"\b(свинг\w*|swing)\b", re.IGNORECASE), "среднесрочной торговли"),
+    (re.compile(r"\b(покажи|расскажи|найди|дай)\b", re.IGNORECASE), ""),
+]
+
+# Ключевые термины (RSI, MACD, годы), которые обязаны совпадать у похожих вопросов
+_KEY_TERMS = re.compile(r"\b([A-Za-z]{2,}|\d{4})\b")
+
+
+def _canonical(text: str) -> str:
+    """Нормализация вопроса перед векторизацией"""
+    for pattern, replacement in _SYNONYMS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _key_terms(text: str) -> frozenset:
+    """Набор ключевых терминов вопроса: индикаторы, темы, рынки, горизонт, отрицания, латиница и годы"""
+    terms = {term.lower() for term in _KEY_TERMS.findall(text)}
+    for category, category_terms in extract_terms(text).items():
+        terms.update(f"{category}:{term}" for term in category_terms)
+    terms.update(f"timeframe:{term}" for term in extract_timeframes(text))
+    terms.update(f"not:{word.lower()}" for word in NEGATION_RE.findall(text))
+    return frozenset(terms)
+
+
+def is_context_dependent(message: str, has_history: bool) -> bool:
+    """Зависит ли сообщение от предыдущих реплик (такие ответы нельзя брать из кэша)"""
+    if not has_history:
+        return False
+    if _CONTEXT_MARKERS.search(message):
+        return True
+    # Короткие реплики вида "а для MACD?" почти всегда продолжают разговор
+    stripped = message.strip().lower()
+    return len(stripped.split()) < 3 or stripped.startswith(("а ", "и ", "and "))
+
+
+class SemanticAnswerCache:
+    """Кэш ответов агента по близости вопросов (косинусная мера на NumPy)"""
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, vectorizer: Optional[HashingVectorizer] = None):
+        self.threshold = Config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or Config.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.ANSWER_CACHE_TTL
+        self.vectorizer = vectorizer or HashingVectorizer()
+
+        # Предвыделенная матрица векторов; свободные/вытесненные строки помечены created_at = 0
+        self._vectors = np.zeros((self.max_entries, self.vectorizer.n_features), dtype=np.float32)
+        self._created_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._questions = [None] * self.max_entries
+        self._answers = [None] * self.max_entries
+        self._terms = [None] * self.max_entries
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Ответ на достаточно похожий недавний вопрос или None"""
+        canonical = _canonical(question)
+        vector = self.vectorizer.transform(canonical)
+        terms = _key_terms(canonical)
+        now = time.time()
+        with self._lock:
+            live = (self._created_at > 0) & (now - self._created_at <= self.ttl_seconds)
+            if not live.any():
+                self.misses += 1
+                return None
+
+            scores = self._vectors @ vector
+            scores[~live] = -1.0
+            best = int(np.argmax(scores))
+            # "RSI" и "MACD", "волатильный" и "боковой" рынок дают близкие векторы, но ответы на них разные
+            if scores[best] < self.threshold or self._terms[best] != terms:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            return self._answers[best]
+
+    def store(self, question: str, answer: str):
+        """Сохранение ответа; при заполнении вытесняется давно не использованная или истёкшая запись"""
+        canonical = _canonical(question)
+        vector = self.vectorizer.transform(canonical)
+        now = time.time()
+        with self._lock:
+            expired = (self._created_at == 0) | (now - self._created_at > self.ttl_seconds)
+            if expired.any():
+                slot = int(np.argmax(expired))
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._terms[slot] = _key_terms(canonical)
+
+    def clear(self):
+        """Очистка кэша"""
+        with self._lock:
+            self._created_at[:] = 0
+            self._last_used[:] = 0
+            self._questions = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+            self._terms = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": int((self._created_at > 0).sum())
+        }
+
+
+_shared_cache: Optional[SemanticAnswerCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Общий для всех сессий процесса кэш ответов"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SemanticAnswerCache()
+    return _shared_cache
@@ -0,0 +1,163 @@
+import contextvars
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from llama_index.core.tools import FunctionTool
+
+from config import Config
+from utils.tokens import count_tokens, truncate_to_tokens
+from utils.tracing import tracer
+
+# Бюджет наблюдений текущего хода (наследуется потоками параллельных инструментов)
+_current_budget: contextvars.ContextVar = contextvars.ContextVar("context_turn_budget", default=None)
+
+# Меньше этого наблюдение уже бесполезно — агенту сообщается, что лимит исчерпан
+_MIN_OBSERVATION_TOKENS = 40
+
+_EXHAUSTED_MESSAGE = (
+    "⚠️ Лимит контекста для результатов инструментов в этом ходе исчерпан. "
+    "Сформулируй ответ по уже полученным данным."
+)
+
+_SECTION_RE = re.compile(r"(?=\n### )")
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s|$)")
+
+
+def parse_tool_budgets(spec: str) -> Dict[str, int]:
+    """Бюджеты инструментов из строки вида tool_a=1000,tool_b=500"""
+    budgets = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+def _truncate_at_sentence(text: str, max_tokens: int) -> str:
+    """Обрезка до бюджета по границе предложения, если она недалеко от конца"""
+    truncated = truncate_to_tokens(text, max_tokens, suffix=None)
+    if len(truncated) == len(text):
+        return text
+    ends = [match.end() for match in _SENTENCE_END_RE.finditer(truncated)]
+    if ends and ends[-1] > len(truncated) * 0.7:
+        truncated = truncated[:ends[-1]]
+    return truncated.rstrip() + " …"
+
+
+def _compact_section(section: str, budget: int) -> str:
+    """Секция наблюдения: список источников сохраняется, сокращается текст ответа"""
+    if count_tokens(section) <= budget:
+        return section
+
+    body, marker, sources = section.partition("📚")
+    sources = marker + sources
+    sources_tokens = count_tokens(sources)
+    if sources_tokens > budget // 2:
+        sources = truncate_to_tokens(sources, budget // 2)
+        sources_tokens = count_tokens(sources)
+
+    body = _truncate_at_sentence(body.rstrip(), max(budget - sources_tokens, 0)) if body.strip() else body
+    return f"{body}\n\n{sources}" if sources else body
+
+
+def compact_observation(text: str, budget: int) -> str:
+    """Наблюдение в пределах budget токенов; бюджет делится между секциями ###"""
+    if count_tokens(text) <= budget:
+        return text
+    sections = [section for section in _SECTION_RE.split(text) if section.strip()]
+    if len(sections) <= 1:
+        return _compact_section(text, budget)
+
+    # Короткие секции остаются целиком, их неиспользованная доля переходит длинным
+    sizes = [count_tokens(section) for section in sections]
+    shares = [0] * len(sections)
+    remaining = budget
+    for position, index in enumerate(sorted(range(len(sections)), key=sizes.__getitem__)):
+        shares[index] = min(sizes[index], remaining // (len(sections) - position))
+        remaining -= shares[index]
+    return "".join(_compact_section(section, share) for section, share in zip(sections, shares))
+
+
+class TurnBudget:
+    """Остаток токенов на наблюдения в одном ходе агента"""
+
+    def __init__(self, tokens: int):
+        self.remaining = tokens
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> int:
+        """Выделение до tokens токенов; возвращает сколько выделено"""
+        with self._lock:
+            granted = max(0, min(tokens, self.remaining))
+            self.remaining -= granted
+            return granted
+
+    def refund(self, tokens: int):
+        with self._lock:
+            self.remaining += max(0, tokens)
+
+
+class ContextAssembler:
+    """Ограничение наблюдений инструментов: бюджет на инструмент и потолок на ход"""
+
+    def __init__(self, default_budget: Optional[int] = None, turn_ceiling: Optional[int] = None,
+                 tool_budgets: Optional[Dict[str, int]] = None):
+        self.default_budget = default_budget or Config.TOOL_OBSERVATION_TOKENS
+        self.turn_ceiling = turn_ceiling or Config.TURN_OBSERVATION_TOKENS
+        self.tool_budgets = tool_budgets if tool_budgets is not None else parse_tool_budgets(
+            Config.TOOL_OBSERVATION_BUDGETS
+        )
+
+    @contextmanager
+    def turn(self):
+        """Новый потолок токенов на наблюдения для хода агента"""
+        token = _current_budget.set(TurnBudget(self.turn_ceiling))
+        try:
+            yield
+        finally:
+            _current_budget.reset(token)
+
+    def budget_for(self, tool_name: str) -> int:
+        return self.tool_budgets.get(tool_name, self.default_budget)
+
+    def fit(self, tool_name: str, text: str) -> str:
+        """Наблюдение инструмента в пределах его бюджета и остатка бюджета хода"""
+        text = str(text)
+        budget = self.budget_for(tool_name)
+        turn_budget = _current_budget.get()
+        if turn_budget is not None:
+            budget = turn_budget.reserve(budget)
+
+        if budget < _MIN_OBSERVATION_TOKENS:
+            if turn_budget is not None:
+                turn_budget.refund(budget)
+            fitted = _EXHAUSTED_MESSAGE
+        else:
+            fitted = compact_observation(text, budget)
+            if turn_budget is not None:
+                # Неиспользованная часть бюджета возвращается следующим наблюдениям
+                turn_budget.refund(budget - count_tokens(fitted))
+
+        tracer.record("context_fit", 0.0, tool=tool_name,
+                      tokens_in=count_tokens(text), tokens_out=count_tokens(fitted))
+        return fitted
+
+    def wrap_tool(self, tool: FunctionTool) -> FunctionTool:
+        """Инструмент с той же схемой, но с ограниченным по токенам результатом"""
+        name = tool.metadata.name
+        fn = tool.fn
+
+        def fitted_tool(*args, **kwargs):
+            return self.fit(name, fn(*args, **kwargs))
+
+        return FunctionTool.from_defaults(
+            fn=fitted_tool,
+            name=name,
+            description=tool.metadata.description,
+            fn_schema=tool.metadata.fn_schema
+        )
+
+
+context_assembler = ContextAssembler()
@@ -1,39 +1,53 @@
 from llama_index.core.agent import ReActAgent
-from llama_index.llms.openai import OpenAI
-from agents.tools import FinanceTools
+from llama_index.core.memory import ChatMemoryBuffer
+from agents.resources import get_llm, get_finance_tools
+from agents.answer_cache import get_answer_cache, is_context_dependent
+from agents.context import context_assembler
+from agents.memory import ConversationMemory
+from agents.parallel_tools import get_agent_tools
+from agents.router import Route, get_router
+from utils.tracing import tracer
 from config import Config
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+from contextlib import nullcontext
+import json
+import time
 
 class FinanceAnalysisAgent:
     """ReAct агент для анализа финансовых исследований"""
     
-    def __init__(self):
-        self.tools = FinanceTools()
+    def __init__(self, llm=None, tools=None):
+        # LLM и инструменты общие для процесса; у сессии — только агент с её памятью
+        self.llm = llm or get_llm()
+        self.tools = tools or get_finance_tools()
+        # Единственный источник истории: окно последних реплик + сводка старых
+        self.memory = ConversationMemory(llm=self.llm)
         self.agent = self._create_agent()
-        self.chat_history = []
+        self.answer_cache = get_answer_cache() if Config.ANSWER_CACHE_ENABLED else None
+        # Простые запросы с одним намерением обходят цикл ReAct
+        self.router = get_router() if Config.ROUTER_ENABLED else None
     
     def _create_agent(self) -> ReActAgent:
         """Создание ReAct агента с финансовыми инструментами"""
         
-        # Инициализация LLM
-        llm = OpenAI(
-            model=Config.LLM_MODEL,
-            temperature=Config.LLM_TEMPERATURE,
-            api_key=Config.OPENAI_API_KEY
-        )
-        
-        # Получение инструментов
-        tools = self.tools.get_tools()
+        # Получение инструментов (с мета-инструментом для параллельных вызовов)
+        tools = get_agent_tools(self.tools)
+        system_prompt = Config.SYSTEM_PROMPT
+        if Config.PARALLEL_TOOLS_ENABLED:
+            system_prompt += Config.PARALLEL_TOOLS_PROMPT
         
         # Создание агента
         agent = ReActAgent.from_tools(
             tools=tools,
-            llm=llm,
+            llm=self.llm,
             verbose=True,
-            system_prompt=Config.SYSTEM_PROMPT,
+            system_prompt=system_prompt,
             max_iterations=10,
             react_chat_formatter=None,
-            memory=None  # Будем управлять историей вручную
+            # Содержимое буфера перед каждым ходом задаёт ConversationMemory
+            memory=ChatMemoryBuffer.from_defaults(
+                token_limit=Config.MEMORY_TOKEN_BUDGET + Config.MEMORY_SUMMARY_TOKENS + 1000
+            )
         )
         
         return agent
@@ -48,44 +62,197 @@ class FinanceAnalysisAgent:
         Returns:
             Ответ агента
         """
+        # Наблюдения инструментов за ход ограничены общим потолком токенов
+        with tracer.turn(mode="chat"), context_assembler.turn():
+            return self._chat(message)
+
+    def _chat(self, message: str) -> str:
         try:
-            # Добавляем сообщение в историю
-            self.chat_history.append({"role": "user", "content": message})
-            
-            # Получаем ответ от агента
-            response = self.agent.chat(message)
-            
-            # Добавляем ответ в историю
-            self.chat_history.append({"role": "assistant", "content": str(response)})
+            # Ответ на похожий вопрос без контекста разговора берём из кэша
+            cacheable = self._is_cacheable(message)
+            if cacheable:
+                cached_answer = self._lookup_cached_answer(message)
+                if cached_answer is not None:
+                    return self._remember_cached_turn(message, cached_answer)
+
+            # Один вызов инструмента и один вызов LLM вместо нескольких шагов рассуждения
+            route, observation = self._fast_path(message)
+            if observation is not None:
+                response = self.llm.chat(self._synthesis_messages(message, route, observation))
+                return self._finish_turn(message, str(response.message.content), cacheable)
+
+            # Контекст агента ограничен бюджетом памяти
+            self._load_memory()
             
-            # Ограничиваем размер истории
-            if len(self.chat_history) > Config.MAX_HISTORY:
-                self.chat_history = self.chat_history[-Config.MAX_HISTORY:]
+            # Получаем ответ от агента; вероятные поиски инструментов идут в фоне, пока LLM рассуждает
+            with self._prefetch(message):
+                response = self.agent.chat(message)
             
-            return str(response)
+            return self._finish_turn(message, str(response), cacheable)
             
         except Exception as e:
             error_message = f"Извините, произошла ошибка: {str(e)}"
-            self.chat_history.append({"role": "assistant", "content": error_message})
+            self.memory.add("user", message)
+            self.memory.add("assistant", error_message)
             return error_message
-    
+
+    def stream_chat(self, message: str) -> Iterator[Dict[str, str]]:
+        """
+        Потоковый вариант chat()
+        
+        Args:
+            message: Сообщение пользователя
+            
+        Yields:
+            События {"type": ..., "content": ...}: "step" — шаг рассуждения
+            или результат инструмента, "token" — фрагмент ответа,
+            "done" — полный ответ, "error" — текст ошибки
+        """
+        with tracer.turn(mode="stream") as turn, context_assembler.turn():
+            started = time.perf_counter()
+            for event in self._stream_chat(message):
+                if event["type"] == "token" and "ttft_ms" not in turn:
+                    # Время до первого токена — главный показатель отзывчивости
+                    turn["ttft_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                yield event
+
+    def _stream_chat(self, message: str) -> Iterator[Dict[str, str]]:
+        try:
+            cacheable = self._is_cacheable(message)
+            if cacheable:
+                cached_answer = self._lookup_cached_answer(message)
+                if cached_answer is not None:
+                    self._remember_cached_turn(message, cached_answer)
+                    yield {"type": "token", "content": cached_answer}
+                    yield {"type": "done", "content": cached_answer}
+                    return
+
+            answer = ""
+            route, observation = self._fast_path(message)
+            if observation is not None:
+                yield {"type": "step", "content": f"⚡ {route.tool}({json.dumps(route.args, ensure_ascii=False)})"}
+                yield {"type": "step", "content": observation}
+                for chunk in self.llm.stream_chat(self._synthesis_messages(message, route, observation)):
+                    if chunk.delta:
+                        answer += chunk.delta
+                        yield {"type": "token", "content": chunk.delta}
+                yield {"type": "done", "content": self._finish_turn(message, answer, cacheable)}
+                return
+
+            self._load_memory()
+
+            with self._prefetch(message):
+                for event in self._stream_agent(message):
+                    if event["type"] == "token":
+                        answer += event["content"]
+                    yield event
+
+            yield {"type": "done", "content": self._finish_turn(message, answer, cacheable)}
+
+        except Exception as e:
+            error_message = f"Извините, произошла ошибка: {str(e)}"
+            self.memory.add("user", message)
+            self.memory.add("assistant", error_message)
+            yield {"type": "error", "content": error_message}
+
+    def _stream_agent(self, message: str) -> Iterator[Dict[str, str]]:
+        """Пошаговый запуск ReAct агента: шаги отдаются сразу, финальный ответ — по токенам"""
+        task = self.agent.create_task(message)
+        shown_steps = 0
+        while True:
+            step_output = self.agent.stream_step(task.task_id)
+
+            # Рассуждения и наблюдения инструментов, появившиеся на этом шаге
+            reasoning = task.extra_state.get("current_reasoning", [])
+            for reasoning_step in reasoning[shown_steps:]:
+                yield {"type": "step", "content": reasoning_step.get_content()}
+            shown_steps = len(reasoning)
+
+            if step_output.is_last:
+                break
+
+        response = self.agent.finalize_response(task.task_id, step_output)
+        for token in response.response_gen:
+            yield {"type": "token", "content": token}
+
+    def _lookup_cached_answer(self, message: str):
+        """Поиск в семантическом кэше с записью спана"""
+        with tracer.span("answer_cache") as span:
+            cached_answer = self.answer_cache.lookup(message)
+            span["hit"] = cached_answer is not None
+        return cached_answer
+
+    def _fast_path(self, message: str):
+        """Маршрут и наблюдение инструмента для быстрого пути; (маршрут, None) — нужен агент"""
+        if self.router is None:
+            return None, None
+        route = self.router.route(message, has_history=not self.memory.is_empty())
+        if not route.fast_path:
+            return route, None
+
+        with tracer.span("fast_path_tool", tool=route.tool):
+            observation = str(getattr(self.tools, route.tool)(**route.args))
+        # Ошибки и тестовый режим без базы знаний агент обработает сам
+        if observation.lstrip().startswith("❌") or "тестовый режим" in observation.lower():
+            self.router.record_fallback(route, "tool_unavailable")
+            return route, None
+        if Config.CONTEXT_BUDGET_ENABLED:
+            observation = context_assembler.fit(route.tool, observation)
+        return route, observation
+
+    def _synthesis_messages(self, message: str, route: Route, observation: str) -> list:
+        """Сообщения для единственного вызова LLM: системный промпт, память и результат инструмента"""
+        from llama_index.core.llms import ChatMessage, MessageRole
+
+        prompt = Config.ROUTER_SYNTHESIS_PROMPT.format(question=message, tool=route.tool, observation=observation)
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=Config.SYSTEM_PROMPT),
+            *self.memory.to_chat_messages(),
+            ChatMessage(role=MessageRole.USER, content=prompt)
+        ]
+
+    def _prefetch(self, message: str):
+        """Упреждающий поиск на время хода (не начатые запросы отменяются в конце хода)"""
+        prefetcher = getattr(self.tools, "prefetcher", None)
+        return prefetcher.turn(message) if prefetcher is not None else nullcontext()
+
+    def _is_cacheable(self, message: str) -> bool:
+        """Можно ли брать ответ на сообщение из кэша и сохранять его туда"""
+        return self.answer_cache is not None and not is_context_dependent(
+            message, not self.memory.is_empty()
+        )
+
+    def _finish_turn(self, message: str, answer: str, cacheable: bool) -> str:
+        """Запись хода в память и кэш; старые реплики сжимаются в фоне"""
+        self.memory.add("user", message)
+        self.memory.add("assistant", answer)
+        self.memory.schedule_compaction()
+
+        if cacheable:
+            self.answer_cache.store(message, answer)
+
+        return answer
+
+    def _load_memory(self):
+        """Передача агенту ограниченного по токенам контекста разговора"""
+        self.agent.memory.set(self.memory.to_chat_messages())
+
+    def _remember_cached_turn(self, message: str, answer: str) -> str:
+        """Запись ответа из кэша в память (для последующих уточнений)"""
+        self.memory.add("user", message)
+        self.memory.add("assistant", answer)
+        self.memory.schedule_compaction()
+        return answer
+
     def get_chat_history(self) -> List[Dict[str, str]]:
         """Получение истории чата"""
-        return self.chat_history
+        return self.memory.history()
     
     def clear_history(self):
         """Очистка истории чата"""
-        self.chat_history = []
+        self.memory.clear()
+        self.agent.reset()
         
     def get_suggestions(self) -> List[str]:
         """Получение предложений для начала разговора"""
-        return [
-            "Покажи мне стратегии связанные с RSI для дневной торговли",
-            "Сравни эффективность MACD и RSI в трендовых рынках", 
-            "Какие стратегии подходят для волатильного рынка?",
-            "Найди исследования по behavioral finance за последние 3 года",
-            "Расскажи о стратегиях mean reversion для криптовалют",
-            "Какие алгоритмические стратегии показывают лучшие результаты?",
-            "Анализ стратегий для sideways рынка с техническим подходом",
-            "Сравни momentum и contrarian стратегии"
-        ]
+        return list(Config.SUGGESTIONS)
@@ -0,0 +1,153 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional
+
+from config import Config
+from utils.tokens import count_tokens, truncate_to_tokens
+
+# Сжатие истории выполняется в фоне, не задерживая ответ пользователю
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+SUMMARY_PROMPT = """Ниже краткое содержание предыдущей части разговора и новые реплики.
+Обнови краткое содержание: сохрани вопросы пользователя, упомянутые индикаторы,
+стратегии, статьи и выводы. Не более {max_tokens} токенов. Пиши по-русски.
+
+Краткое содержание:
+{summary}
+
+Новые реплики:
+{messages}
+
+Обновлённое краткое содержание:"""
+
+
+class ConversationMemory:
+    """Память разговора с бюджетом в токенах: окно последних реплик + сводка более старых"""
+
+    def __init__(self, llm: Optional[Any] = None, token_budget: Optional[int] = None,
+                 summary_tokens: Optional[int] = None, max_messages: Optional[int] = None):
+        self.llm = llm
+        self.token_budget = token_budget or Config.MEMORY_TOKEN_BUDGET
+        self.summary_tokens = summary_tokens or Config.MEMORY_SUMMARY_TOKENS
+        self.max_messages = max_messages or Config.MAX_HISTORY
+
+        # Окно последних реплик: (role, content, tokens); добавление и вытеснение за O(1)
+        self._recent = deque()
+        self._recent_tokens = 0
+        # Вытесненные реплики, ещё не вошедшие в сводку
+        self._pending: List[Dict[str, str]] = []
+        self._summary = ""
+        self._compaction: Optional[Future] = None
+        # Меняется при очистке, чтобы запоздавшее сжатие не вернуло старую сводку
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def is_empty(self) -> bool:
+        """Пустая ли память (нет ни реплик, ни сводки)"""
+        with self._lock:
+            return not self._recent and not self._pending and not self._summary
+
+    def add(self, role: str, content: str):
+        """Добавление реплики; старые реплики сверх бюджета уходят на сжатие"""
+        tokens = count_tokens(content)
+        with self._lock:
+            self._recent.append((role, content, tokens))
+            self._recent_tokens += tokens
+            while len(self._recent) > 1 and (
+                self._recent_tokens > self.token_budget or len(self._recent) > self.max_messages
+            ):
+                old_role, old_content, old_tokens = self._recent.popleft()
+                self._recent_tokens -= old_tokens
+                self._pending.append({"role": old_role, "content": old_content})
+
+    def schedule_compaction(self):
+        """Фоновое обновление сводки после завершения хода"""
+        with self._lock:
+            if not self._pending:
+                return
+            if self._compaction is not None and not self._compaction.done():
+                # Текущее сжатие подхватит новые реплики в следующий раз
+                return
+            self._compaction = _summary_executor.submit(self._compact)
+
+    def wait(self, timeout: Optional[float] = None):
+        """Ожидание фонового сжатия (для пакетной обработки и отладки)"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.result(timeout=timeout)
+
+    def _compact(self):
+        """Инкрементальное обновление сводки по накопившимся вытесненным репликам"""
+        with self._lock:
+            pending = list(self._pending)
+            summary = self._summary
+            generation = self._generation
+
+        messages = "\n".join(f"{m['role']}: {m['content']}" for m in pending)
+        new_summary = None
+        if self.llm is not None:
+            try:
+                prompt = SUMMARY_PROMPT.format(
+                    max_tokens=self.summary_tokens,
+                    summary=summary or "(пусто)",
+                    messages=messages
+                )
+                new_summary = str(self.llm.complete(prompt).text).strip()
+            except Exception as e:
+                print(f"Ошибка сжатия истории: {e}")
+
+        if not new_summary:
+            # Без LLM сводка — это хвост старых реплик
+            new_summary = f"{summary}\n{messages}".strip()
+            new_summary = new_summary[-self.summary_tokens * 4:]
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._summary = truncate_to_tokens(new_summary, self.summary_tokens)
+            del self._pending[:len(pending)]
+
+    def to_chat_messages(self) -> list:
+        """Контекст для агента: сводка (system) + окно последних реплик"""
+        from llama_index.core.llms import ChatMessage, MessageRole
+
+        with self._lock:
+            summary = self._summary
+            recent = list(self._recent)
+
+        messages = []
+        if summary:
+            messages.append(ChatMessage(
+                role=MessageRole.SYSTEM,
+                content=f"Краткое содержание предыдущего разговора:\n{summary}"
+            ))
+        for role, content, _ in recent:
+            messages.append(ChatMessage(role=MessageRole(role), content=content))
+        return messages
+
+    def history(self) -> List[Dict[str, str]]:
+        """Последние реплики в виде списка словарей"""
+        with self._lock:
+            return [{"role": role, "content": content} for role, content, _ in self._recent]
+
+    def token_count(self) -> int:
+        """Размер контекста, который получит агент"""
+        with self._lock:
+            return self._recent_tokens + count_tokens(self._summary)
+
+    def clear(self):
+        """Очистка памяти"""
+        with self._lock:
+            self._recent.clear()
+            self._recent_tokens = 0
+            self._pending = []
+            self._summary = ""
+            self._generation += 1
@@ -0,0 +1,99 @@
+import contextvars
+import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+from llama_index.core.tools import FunctionTool
+
+from config import Config
+
+PARALLEL_TOOL_NAME = "run_tools_parallel"
+
+PARALLEL_TOOL_DESCRIPTION = """run_tools_parallel(calls: List[dict]) -> str
+Выполняет несколько НЕЗАВИСИМЫХ инструментов одновременно и возвращает все результаты разом.
+Используй, когда для ответа нужны несколько поисков, не зависящих друг от друга
+(например, стратегии для MACD и для RSI). Каждый элемент calls:
+{"tool": "<имя инструмента>", "args": {<аргументы инструмента>}}
+Доступные инструменты: {tool_names}"""
+
+# Общий пул для вызовов инструментов всех сессий
+_executor = ThreadPoolExecutor(
+    max_workers=Config.PARALLEL_TOOLS_MAX_WORKERS,
+    thread_name_prefix="parallel-tool"
+)
+
+# Инструменты агента строятся один раз на набор FinanceTools
+_agent_tools: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _run_call(tools_by_name: Dict[str, FunctionTool], call: Dict[str, Any]) -> str:
+    """Выполнение одного вызова; ошибка возвращается как наблюдение, а не исключение"""
+    name = call.get("tool")
+    args = call.get("args") or {}
+    tool = tools_by_name.get(name)
+    if tool is None:
+        return f"❌ Неизвестный инструмент: {name}"
+    try:
+        return str(tool.call(**args).content)
+    except Exception as e:
+        return f"❌ Ошибка инструмента {name}: {str(e)}"
+
+
+def make_parallel_tool(tools: List[FunctionTool]) -> FunctionTool:
+    """Мета-инструмент, позволяющий агенту сделать несколько вызовов за один шаг ReAct"""
+    tools_by_name = {tool.metadata.name: tool for tool in tools}
+
+    def run_tools_parallel(calls: List[Dict[str, Any]]) -> str:
+        """Одновременное выполнение нескольких независимых инструментов"""
+        if not calls:
+            return "❌ Не передано ни одного вызова"
+
+        skipped = calls[Config.PARALLEL_TOOLS_MAX_CALLS:]
+        calls = calls[:Config.PARALLEL_TOOLS_MAX_CALLS]
+        # У каждого потока своя копия контекста (turn_id для трассировки)
+        futures = [
+            _executor.submit(contextvars.copy_context().run, _run_call, tools_by_name, call)
+            for call in calls
+        ]
+
+        # Наблюдения объединяются в порядке вызовов
+        observations = []
+        for call, future in zip(calls, futures):
+            args = json.dumps(call.get("args") or {}, ensure_ascii=False)
+            observations.append(f"### {call.get('tool')}({args})\n{future.result()}")
+        if skipped:
+            # Агент должен знать, что часть вызовов не выполнялась, и повторить их отдельно
+            skipped_calls = "\n".join(
+                f"- {call.get('tool')}({json.dumps(call.get('args') or {}, ensure_ascii=False)})" for call in skipped
+            )
+            observations.append(
+                f"### ⚠️ Не выполнено (лимит {Config.PARALLEL_TOOLS_MAX_CALLS} вызовов за раз)\n"
+                f"Повтори эти вызовы следующим шагом:\n{skipped_calls}"
+            )
+        return "\n\n".join(observations)
+
+    return FunctionTool.from_defaults(
+        fn=run_tools_parallel,
+        name=PARALLEL_TOOL_NAME,
+        description=PARALLEL_TOOL_DESCRIPTION.replace("{tool_names}", ", ".join(tools_by_name))
+    )
+
+
+def get_agent_tools(finance_tools) -> List[FunctionTool]:
+    """Инструменты FinanceTools (с бюджетом токенов) плюс параллельный мета-инструмент"""
+    agent_tools = _agent_tools.get(finance_tools)
+    if agent_tools is not None:
+        return agent_tools
+
+    tools = finance_tools.get_tools()
+    if Config.CONTEXT_BUDGET_ENABLED:
+        from agents.context import context_assembler
+
+        # Ограничиваются базовые инструменты, поэтому и вызовы внутри run_tools_parallel
+        tools = [context_assembler.wrap_tool(tool) for tool in tools]
+    if Config.PARALLEL_TOOLS_ENABLED and tools:
+        tools = tools + [make_parallel_tool(tools)]
+
+    if tools:
+        _agent_tools[finance_tools] = tools
+    return tools
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from config import Config
+
+
+class PoolSaturated(Exception):
+    """Все слоты заняты: вызывающий должен повторить запрос позже"""
+
+
+class _Session:
+    def __init__(self, agent: Any):
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Ходы, занявшие сессию или ждущие её блокировку (под AgentPool._lock): такие не вытесняются
+        self.users = 0
+
+
+class AgentLease:
+    """Занятый на один ход агент; release() идемпотентен"""
+
+    def __init__(self, pool: "AgentPool", session: _Session):
+        self.agent = session.agent
+        self._pool = pool
+        self._session = session
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._pool._release(self._session)
+
+
+class AgentPool:
+    """Агенты по session_id с вытеснением простаивающих и ограничением одновременных ходов"""
+
+    def __init__(self, max_sessions: Optional[int] = None, idle_timeout: Optional[float] = None,
+                 max_concurrent_turns: Optional[int] = None, queue_timeout: Optional[float] = None,
+                 agent_factory=None):
+        self.max_sessions = max_sessions or Config.API_MAX_SESSIONS
+        self.idle_timeout = idle_timeout or Config.API_SESSION_IDLE_TIMEOUT
+        self.queue_timeout = Config.API_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.max_concurrent_turns = max_concurrent_turns or Config.API_MAX_CONCURRENT_TURNS
+        self._agent_factory = agent_factory or self._create_agent
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Слоты ходов: LLM и поиск ограничены, лишние запросы получают отказ, а не очередь без конца
+        self._slots = threading.BoundedSemaphore(self.max_concurrent_turns)
+        self._active_turns = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _create_agent():
+        from agents.finance_agent import FinanceAnalysisAgent
+
+        # LLM и инструменты общие для процесса (agents.resources)
+        return FinanceAnalysisAgent()
+
+    def _get_session(self, session_id: str) -> _Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = time.monotonic()
+                session.users += 1
+                return session
+
+        # Агент создаётся вне общей блокировки, чтобы не задерживать другие сессии
+        created = _Session(self._agent_factory())
+        with self._lock:
+            session = self._sessions.setdefault(session_id, created)
+            self._sessions.move_to_end(session_id)
+            # Сессия помечается занятой до вытеснения, иначе её могут вытеснить до начала хода
+            session.users += 1
+            self._evict_overflow()
+        return session
+
+    def _evict_overflow(self):
+        """Вытеснение давно не использованных сессий сверх max_sessions (под self._lock)"""
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not self._sessions[session_id].users:
+                del self._sessions[session_id]
+                self.evicted += 1
+
+    def lease(self, session_id: str) -> "AgentLease":
+        """Слот и агент сессии до вызова release(); PoolSaturated, если слота нет"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated("Все агенты заняты, повторите запрос позже")
+
+        try:
+            session = self._get_session(session_id)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        try:
+            # Ходы одной сессии выполняются по очереди: у агента одна память
+            if not session.lock.acquire(timeout=self.queue_timeout):
+                with self._lock:
+                    self.rejected += 1
+                raise PoolSaturated("Предыдущий запрос этой сессии ещё выполняется")
+        except BaseException:
+            with self._lock:
+                session.users -= 1
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._active_turns += 1
+        return AgentLease(self, session)
+
+    def _release(self, session: _Session):
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._active_turns -= 1
+            session.users -= 1
+        session.lock.release()
+        self._slots.release()
+
+    @contextmanager
+    def acquire(self, session_id: str) -> Iterator[Any]:
+        """Агент сессии на время одного хода"""
+        lease = self.lease(session_id)
+        try:
+            yield lease.agent
+        finally:
+            lease.release()
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """Агент сессии без занятия слота (None, если сессии нет)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        return session.agent if session else None
+
+    def remove(self, session_id: str) -> bool:
+        """Удаление сессии вместе с её историей"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """Удаление сессий, простаивающих дольше idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                session_id for session_id, session in self._sessions.items()
+                if now - session.last_used > self.idle_timeout and not session.users
+            ]
+            for session_id in expired:
+                del self._sessions[session_id]
+            self.evicted += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние пула для health-check и балансировщика"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "active_turns": self._active_turns,
+                "max_concurrent_turns": self.max_concurrent_turns,
+                "rejected": self.rejected,
+                "evicted": self.evicted
+            }
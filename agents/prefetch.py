@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from utils.source_nodes import DEFAULT_FIELDS
+from utils.tracing import tracer
+from agents.router import analysis_type_slot, slot_label, timeframe_slot
+from utils.vocabulary import COMPARE_RE, extract_ordered_terms
+
+
+def _key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class Prefetcher:
+    """Упреждающий поиск: прогрев известных запросов при старте и вероятных запросов инструментов во время хода"""
+
+    def __init__(self, tools: Any, top_k: int, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, max_results: Optional[int] = None,
+                 per_turn: Optional[int] = None, ttl: Optional[float] = None):
+        self.tools = tools
+        self.top_k = top_k
+        self.max_pending = max_pending or Config.PREFETCH_MAX_PENDING
+        self.max_results = max_results or Config.PREFETCH_MAX_RESULTS
+        self.per_turn = per_turn or Config.PREFETCH_MAX_PER_TURN
+        self.ttl = ttl or Config.PREFETCH_TTL
+        # Отдельный небольшой пул: упреждающие запросы не занимают потоки инструментов
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.PREFETCH_WORKERS,
+            thread_name_prefix="prefetch"
+        )
+        # Нормализованный запрос -> (Future, время постановки); порядок вставки — для истечения TTL
+        self._entries: "OrderedDict[str, Tuple[Future, float]]" = OrderedDict()
+        self._stats = {"issued": 0, "hits": 0, "misses": 0, "cancelled": 0, "expired": 0, "failed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def speculative_queries(self, message: str) -> List[str]:
+        """Запросы, которые инструменты вероятно выполнят для сообщения (по упомянутым терминам)"""
+        # Аргументы строятся так же, как слоты маршрутизатора, чтобы ключи совпадали с вызовами инструментов
+        terms = {category: [slot_label(term) for term in category_terms]
+                 for category, category_terms in extract_ordered_terms(message).items()}
+        named = terms["indicator"] + terms["topic"]
+        timeframe = timeframe_slot(message)
+        analysis_type = analysis_type_slot(message)
+
+        queries = []
+        if len(named) >= 2 and COMPARE_RE.search(message):
+            queries += [self.tools.strategy_query(name) for name in named]
+        queries += [self.tools.indicator_query(name, timeframe) for name in terms["indicator"]]
+        for market in terms["market"]:
+            queries += [query for _, query in self.tools.market_sections(market, analysis_type)]
+        queries += [self.tools.strategy_query(name) for name in terms["topic"]]
+
+        unique = list(dict.fromkeys(queries))
+        return unique[:self.per_turn]
+
+    def _fetch(self, query: str) -> Optional[Dict[str, Any]]:
+        with tracer.span("prefetch_fetch") as span:
+            result = self.tools.llama_client.query(query, top_k=self.top_k, fields=DEFAULT_FIELDS)
+            if result.get("error"):
+                span["error"] = result["error"]
+        return result
+
+    def _expire(self):
+        """Удаление невостребованных записей старше TTL или сверх max_results (вызывается под блокировкой)"""
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            key, (future, created) = next(iter(self._entries.items()))
+            if created > deadline and len(self._entries) < self.max_results:
+                break
+            del self._entries[key]
+            future.cancel()
+            self._stats["expired"] += 1
+
+    def submit(self, query: str) -> Optional[str]:
+        """Постановка запроса в фон; None — уже поставлен или достигнут предел"""
+        key = _key(query)
+        with self._lock:
+            self._expire()
+            if key in self._entries:
+                return None
+            # Ограничено число выполняющихся и ждущих запросов; готовые результаты ждут востребования
+            if sum(not future.done() for future, _ in self._entries.values()) >= self.max_pending:
+                self._stats["skipped"] += 1
+                return None
+            self._entries[key] = (self._executor.submit(self._fetch, query), time.monotonic())
+            self._stats["issued"] += 1
+        return key
+
+    def claim(self, query: str) -> Optional[Dict[str, Any]]:
+        """Результат упреждающего запроса (с ожиданием, если он уже выполняется); None — искать обычным путём"""
+        started = time.perf_counter()
+        with self._lock:
+            entry = self._entries.pop(_key(query), None)
+
+        result = None
+        if entry is not None:
+            future, created = entry
+            if future.cancel():
+                # Ещё не начат — инструмент выполнит запрос сам, не дожидаясь очереди
+                self._count("cancelled")
+            elif time.monotonic() - created <= self.ttl:
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                if result is not None and result.get("error"):
+                    # Ошибку не отдаём: у инструмента будет своя попытка
+                    self._count("failed")
+                    result = None
+
+        self._count("hits" if result is not None else "misses")
+        tracer.record("prefetch", (time.perf_counter() - started) * 1000, hit=result is not None)
+        return result
+
+    def cancel(self, keys: Iterable[str]):
+        """Отмена ещё не начатых упреждающих запросов"""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0].cancel():
+                    del self._entries[key]
+                    self._stats["cancelled"] += 1
+
+    @contextmanager
+    def turn(self, message: str):
+        """Упреждающий поиск на время хода; не начатые к концу хода запросы отменяются"""
+        keys = [key for key in map(self.submit, self.speculative_queries(message)) if key is not None]
+        try:
+            yield keys
+        finally:
+            self.cancel(keys)
+
+    def warm_up(self, prompts: Iterable[str]) -> int:
+        """Фоновый прогрев запросов для известных подсказок; возвращает число поставленных запросов"""
+        return sum(
+            1 for prompt in prompts
+            for query in self.speculative_queries(prompt)
+            if self.submit(query) is not None
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики и доли: hit_rate — доля полезных запросов, coverage — доля поисков из упреждения"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / stats["issued"] if stats["issued"] else 0.0
+        lookups = stats["hits"] + stats["misses"]
+        stats["coverage"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def shutdown(self):
+        """Отмена очереди и остановка пула"""
+        with self._lock:
+            self._entries.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
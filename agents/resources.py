@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from config import Config
+
+# Общие для процесса ресурсы: создаются один раз и разделяются всеми сессиями.
+# Состояние разговора хранится только в FinanceAnalysisAgent каждой сессии.
+_lock = threading.Lock()
+_llm: Optional[Any] = None
+_finance_tools: Optional[Any] = None
+_startup_timings: Dict[str, float] = {}
+
+
+def _timed(name: str, factory):
+    """Создание ресурса с записью времени инициализации"""
+    started = time.perf_counter()
+    resource = factory()
+    _startup_timings[name] = time.perf_counter() - started
+    return resource
+
+
+def _create_llm():
+    # Тяжёлый импорт откладывается до первого использования
+    from llama_index.llms.openai import OpenAI
+    from llama_index.core.callbacks import CallbackManager
+
+    handlers = []
+    if Config.TRACING_ENABLED:
+        from agents.trace_callbacks import TracingCallbackHandler
+        handlers.append(TracingCallbackHandler())
+
+    # Агент наследует callback_manager от LLM, поэтому спаны видны и для инструментов
+    return OpenAI(
+        model=Config.LLM_MODEL,
+        temperature=Config.LLM_TEMPERATURE,
+        api_key=Config.OPENAI_API_KEY,
+        callback_manager=CallbackManager(handlers)
+    )
+
+
+def _create_finance_tools():
+    from agents.tools import FinanceTools
+
+    tools = FinanceTools()
+    # Метаданные инструментов строятся сразу, чтобы сессии их только переиспользовали
+    tools.get_tools()
+    if tools.prefetcher is not None and Config.PREFETCH_WARMUP:
+        # Поиски для подсказок выполняются в фоне до первого пользователя
+        tools.prefetcher.warm_up(Config.SUGGESTIONS)
+    return tools
+
+
+def get_llm():
+    """Общий LLM клиент (OpenAI клиент потокобезопасен)"""
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                _llm = _timed("llm", _create_llm)
+    return _llm
+
+
+def get_finance_tools():
+    """Общие инструменты вместе с HTTP пулом, кэшами и локальным индексом"""
+    global _finance_tools
+    if _finance_tools is None:
+        with _lock:
+            if _finance_tools is None:
+                _finance_tools = _timed("tools", _create_finance_tools)
+    return _finance_tools
+
+
+def get_startup_timings() -> Dict[str, float]:
+    """Время инициализации общих ресурсов, секунды"""
+    return dict(_startup_timings)
@@ -0,0 +1,276 @@
+import datetime
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from agents.answer_cache import is_context_dependent
+from utils.text_vectors import HashingVectorizer
+from utils.tracing import tracer
+from utils.vocabulary import COMPARE_RE, NEGATION_RE, extract_ordered_terms, extract_timeframes
+
+# Размеченные примеры намерений: по ним строятся центроиды модели ближайшего центроида
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "indicator": [
+        "стратегии RSI для дневной торговли",
+        "торговые стратегии на основе MACD",
+        "как торговать по полосам Боллинджера",
+        "сигналы входа и выхода по стохастику",
+        "стратегии со скользящими средними для свинг трейдинга",
+        "RSI strategies for intraday trading",
+        "trading rules based on the ichimoku indicator",
+        "покажи стратегии с индикатором ATR",
+    ],
+    "compare": [
+        "сравни MACD и RSI",
+        "сравнение momentum и contrarian стратегий",
+        "что лучше: mean reversion или trend following",
+        "RSI vs MACD эффективность",
+        "compare momentum and mean reversion strategies",
+        "сравни эффективность стохастика и RSI",
+        "momentum против contrarian",
+    ],
+    "market": [
+        "какие стратегии подходят для волатильного рынка",
+        "стратегии для бокового рынка",
+        "анализ стратегий для sideways рынка",
+        "как торговать на медвежьем рынке",
+        "стратегии для трендового рынка с фундаментальным анализом",
+        "best strategies for a volatile market",
+        "trading strategies for bear markets",
+    ],
+    "papers": [
+        "найди исследования по behavioral finance за последние 3 года",
+        "научные статьи про машинное обучение в трейдинге",
+        "исследования по momentum с 2021 года",
+        "публикации о высокочастотной торговле",
+        "research papers on pairs trading since 2020",
+        "find papers about sentiment analysis in finance",
+        "последние исследования по RSI",
+    ],
+    "other": [
+        "привет, что ты умеешь",
+        "объясни простыми словами что такое альфа",
+        "почему моя стратегия перестала работать",
+        "построй торговую систему и объясни каждый шаг",
+        "подробнее о втором пункте",
+        "спасибо",
+        "как составить план обучения трейдингу",
+        "what can you do",
+        "explain the difference between sharpe and sortino ratio",
+    ],
+}
+
+# Инструмент для каждого намерения быстрого пути
+INTENT_TOOLS: Dict[str, str] = {
+    "indicator": "search_indicator_strategies",
+    "compare": "compare_strategies",
+    "market": "analyze_market_conditions",
+    "papers": "find_research_papers",
+}
+
+_PAPERS_RE = re.compile(
+    r"исследовани\w*|стать(?:я|и|ей|ям|ях|ю)(?!\w)|публикаци\w*|papers?|research|studies",
+    re.IGNORECASE | re.UNICODE
+)
+_MARKET_RE = re.compile(r"рын(?:ок|ка|ке|ку|ков|ках|кам|ком)|markets?", re.IGNORECASE | re.UNICODE)
+# Составные вопросы и просьбы объяснить требуют полного цикла рассуждений
+_COMPLEX_RE = re.compile(
+    r"почему|объясни\w*|обоснуй\w*|пошагов\w*|шаг за шагом|затем|после этого|построй\w*|why|explain|step by step",
+    re.IGNORECASE | re.UNICODE
+)
+_FUNDAMENTAL_RE = re.compile(r"фундаментальн\w*|fundamental", re.IGNORECASE | re.UNICODE)
+_LAST_YEARS_RE = re.compile(r"(?:последн\w+|last|past)\s+(\d{1,2})\s+(?:год\w*|лет|years?)", re.IGNORECASE)
+_SINCE_YEAR_RE = re.compile(r"(?:начиная с|после|since|after|from|с)\s+((?:19|20)\d{2})", re.IGNORECASE)
+_YEAR_RE = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+# Верхняя граница лет: у find_research_papers нет year_to, такие запросы обрабатывает агент
+_UNTIL_YEAR_RE = re.compile(
+    r"(?<!\w)(?:до|по|before|until|till|through|to)\s+(?:19|20)\d{2}|(?:19|20)\d{2}\s*[-–—]\s*(?:19|20)\d{2}",
+    re.IGNORECASE
+)
+
+
+def is_negated(message: str) -> bool:
+    """Отрицание перед термином («без RSI», «кроме momentum»): слоты инструмента его не передают"""
+    negation = NEGATION_RE.search(message)
+    if negation is None:
+        return False
+    rest = message[negation.end():]
+    return any(extract_ordered_terms(rest).values()) or bool(extract_timeframes(rest))
+
+
+def has_unsupported_years(message: str) -> bool:
+    """Годы, которые слоты не передают: верхняя граница, диапазон, точный год («за 2023 год»)"""
+    if _UNTIL_YEAR_RE.search(message):
+        return True
+    return len(_YEAR_RE.findall(message)) > len(_SINCE_YEAR_RE.findall(message))
+
+
+def slot_label(term: str) -> str:
+    """Значение аргумента инструмента для канонического термина словаря"""
+    return term.replace("_", " ")
+
+
+def timeframe_slot(message: str) -> str:
+    """Аргумент timeframe для search_indicator_strategies"""
+    timeframes = extract_timeframes(message)
+    return timeframes[0] if timeframes else "any"
+
+
+def analysis_type_slot(message: str) -> str:
+    """Аргумент analysis_type для analyze_market_conditions"""
+    return "fundamental" if _FUNDAMENTAL_RE.search(message) else "technical"
+
+
+class Route:
+    """Решение маршрутизатора: инструмент с аргументами или причина идти через агента"""
+
+    __slots__ = ("intent", "tool", "args", "similarity", "reason")
+
+    def __init__(self, intent: str, tool: Optional[str] = None, args: Optional[Dict[str, Any]] = None,
+                 similarity: float = 0.0, reason: Optional[str] = None):
+        self.intent = intent
+        self.tool = tool
+        self.args = args or {}
+        self.similarity = similarity
+        self.reason = reason
+
+    @property
+    def fast_path(self) -> bool:
+        return self.tool is not None
+
+    def __repr__(self) -> str:
+        return f"Route(intent={self.intent!r}, tool={self.tool!r}, args={self.args!r}, reason={self.reason!r})"
+
+
+class IntentRouter:
+    """Офлайн классификатор намерений и слотов: правила + модель ближайшего центроида на хэш-векторах"""
+
+    def __init__(self, min_similarity: Optional[float] = None, min_margin: Optional[float] = None,
+                 max_words: Optional[int] = None, examples: Optional[Dict[str, List[str]]] = None):
+        self.min_similarity = Config.ROUTER_MIN_SIMILARITY if min_similarity is None else min_similarity
+        self.min_margin = Config.ROUTER_MIN_MARGIN if min_margin is None else min_margin
+        self.max_words = max_words or Config.ROUTER_MAX_WORDS
+
+        examples = examples or INTENT_EXAMPLES
+        self.vectorizer = HashingVectorizer(n_features=2048)
+        self.intents = list(examples)
+        centroids = np.stack([self.vectorizer.transform_many(texts).mean(axis=0) for texts in examples.values()])
+        self.centroids = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        self._routed = 0
+        self._fast_path: Dict[str, int] = defaultdict(int)
+        self._fallback: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def classify(self, message: str) -> Tuple[str, float, float]:
+        """Намерение модели, косинусная близость к центроиду и отрыв от второго намерения"""
+        similarities = self.centroids @ self.vectorizer.transform(message)
+        second, best = np.argsort(similarities)[-2:]
+        return self.intents[best], float(similarities[best]), float(similarities[best] - similarities[second])
+
+    @staticmethod
+    def rule_intent(message: str, terms: Dict[str, List[str]]) -> Optional[str]:
+        """Намерение по правилам; None — запрос не сводится к одному вызову инструмента"""
+        named = terms["indicator"] + terms["topic"]
+        if COMPARE_RE.search(message):
+            # Рыночный контекст сравнения compare_strategies не передать
+            return "compare" if len(named) == 2 and not terms["market"] else None
+        if _PAPERS_RE.search(message):
+            return "papers" if named or terms["market"] else None
+        if terms["market"] and _MARKET_RE.search(message):
+            return "market" if len(terms["market"]) == 1 and not terms["indicator"] else None
+        if len(terms["indicator"]) == 1 and not terms["market"]:
+            return "indicator"
+        return None
+
+    @staticmethod
+    def extract_slots(intent: str, message: str, terms: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Аргументы инструмента для намерения"""
+        if intent == "indicator":
+            return {"indicator_name": slot_label(terms["indicator"][0]), "timeframe": timeframe_slot(message)}
+        if intent == "compare":
+            first, second = terms["indicator"] + terms["topic"]
+            return {"strategy1": slot_label(first), "strategy2": slot_label(second)}
+        if intent == "market":
+            return {"market_type": slot_label(terms["market"][0]), "analysis_type": analysis_type_slot(message)}
+
+        args = {"topic": slot_label((terms["topic"] + terms["indicator"] + terms["market"])[0])}
+        last_years = _LAST_YEARS_RE.search(message)
+        since_year = _SINCE_YEAR_RE.search(message)
+        if last_years:
+            args["year_from"] = datetime.date.today().year - int(last_years.group(1))
+        elif since_year:
+            args["year_from"] = int(since_year.group(1))
+        return args
+
+    def route(self, message: str, has_history: bool = False) -> Route:
+        """Быстрый путь, если правила и модель согласны и уверены, иначе причина отказа"""
+        started = time.perf_counter()
+        terms = extract_ordered_terms(message)
+        intent, similarity, margin = self.classify(message)
+
+        if is_context_dependent(message, has_history):
+            route = Route(intent, similarity=similarity, reason="context")
+        elif len(message.split()) > self.max_words or _COMPLEX_RE.search(message):
+            route = Route(intent, similarity=similarity, reason="complex")
+        elif is_negated(message):
+            route = Route(intent, similarity=similarity, reason="negation")
+        else:
+            rule = self.rule_intent(message, terms)
+            if rule is None:
+                route = Route(intent, similarity=similarity, reason="no_rule")
+            elif rule != intent:
+                route = Route(rule, similarity=similarity, reason="disagree")
+            elif similarity < self.min_similarity or margin < self.min_margin:
+                route = Route(intent, similarity=similarity, reason="low_confidence")
+            elif has_unsupported_years(message):
+                route = Route(intent, similarity=similarity, reason="unsupported_slot")
+            else:
+                route = Route(intent, INTENT_TOOLS[intent], self.extract_slots(intent, message, terms), similarity)
+
+        with self._lock:
+            self._routed += 1
+            if route.fast_path:
+                self._fast_path[route.intent] += 1
+            else:
+                self._fallback[route.reason] += 1
+        tracer.record("router", (time.perf_counter() - started) * 1000,
+                      intent=route.intent, reason=route.reason, hit=route.fast_path)
+        return route
+
+    def record_fallback(self, route: Route, reason: str):
+        """Быстрый путь не удался после маршрутизации — ход передан агенту"""
+        with self._lock:
+            self._fast_path[route.intent] -= 1
+            self._fallback[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Доля быстрого пути, его разбивка по намерениям и причины передачи агенту"""
+        with self._lock:
+            fast_path = sum(self._fast_path.values())
+            return {
+                "routed": self._routed,
+                "fast_path": fast_path,
+                "fast_path_rate": fast_path / self._routed if self._routed else 0.0,
+                "intents": dict(self._fast_path),
+                "fallback_reasons": dict(self._fallback),
+            }
+
+
+_shared_router: Optional[IntentRouter] = None
+_shared_router_lock = threading.Lock()
+
+
+def get_router() -> IntentRouter:
+    """Общий для процесса маршрутизатор (центроиды строятся один раз)"""
+    global _shared_router
+    if _shared_router is None:
+        with _shared_router_lock:
+            if _shared_router is None:
+                _shared_router = IntentRouter()
+    return _shared_router
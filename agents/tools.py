@@ -1,38 +1,184 @@
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from llama_index.core.tools import FunctionTool
 import os
 
+from config import Config
+from utils.async_utils import run_sync
+from utils.source_nodes import DEFAULT_FIELDS
+
 # Проверяем, доступен ли LlamaIndex клиент
 try:
-    from utils.llama_client import LlamaIndexClient
+    from utils.llama_client import LlamaIndexClient, AsyncLlamaIndexClient
+    from utils.retrieval_cache import CachedRetriever, get_retrieval_cache
+    from utils.resilience import ResilientRetriever
     LLAMA_AVAILABLE = True
 except ImportError:
     LLAMA_AVAILABLE = False
 
+# Локальный индекс требует только NumPy
+try:
+    from utils.local_index import LocalVectorIndex
+    LOCAL_INDEX_AVAILABLE = True
+except ImportError:
+    LOCAL_INDEX_AVAILABLE = False
+
+from utils.metadata_index import get_metadata_index
+from agents.prefetch import Prefetcher
+
+# Переранжирование источников (NumPy)
+try:
+    from utils.rerank import rerank
+    RERANK_AVAILABLE = True
+except ImportError:
+    RERANK_AVAILABLE = False
+
 class FinanceTools:
     """Инструменты для финансового анализа"""
-    
+
     def __init__(self):
+        self._tools = None
+        self.llama_client = None
+        self.local_index = self._open_local_index()
+        # Индекс метаданных статей: списки статей без удалённого вызова, сужение выдачи
+        self.metadata_index = get_metadata_index() if Config.METADATA_INDEX_ENABLED else None
+
         if LLAMA_AVAILABLE and os.getenv("LLAMA_INDEX_URL"):
             try:
-                self.llama_client = LlamaIndexClient()
-                self.use_llamaindex = True
+                cache = get_retrieval_cache() if Config.RETRIEVAL_CACHE_ENABLED else None
+                # Дедлайн, повторы и размыкатель; при отказе — устаревший кэш или локальный индекс
+                self.llama_client = ResilientRetriever(
+                    LlamaIndexClient(), fallback=self.local_index, stale_cache=cache
+                )
+                if cache is not None:
+                    self.llama_client = CachedRetriever(self.llama_client, cache)
             except Exception as e:
                 print(f"Ошибка подключения к LlamaIndex: {e}")
-                self.use_llamaindex = False
-        else:
-            self.use_llamaindex = False
-    
+                self.llama_client = None
+
+        # Без удалённого API поиск идёт по локальному индексу в процессе
+        if self.llama_client is None:
+            self.llama_client = self.local_index
+
+        self.use_llamaindex = self.llama_client is not None
+        self.async_client = None
+        if self.use_llamaindex and LLAMA_AVAILABLE:
+            self.async_client = AsyncLlamaIndexClient(self.llama_client)
+
+        # Упреждающий поиск имеет смысл только для удалённого API (локальный индекс быстрый)
+        self.prefetcher = None
+        if Config.PREFETCH_ENABLED and self.use_llamaindex and self.llama_client is not self.local_index:
+            self.prefetcher = Prefetcher(self, top_k=self._candidates_k())
+
+    @staticmethod
+    def _open_local_index():
+        """Открытие локального индекса, если он построен"""
+        if not LOCAL_INDEX_AVAILABLE or not os.path.isdir(Config.LOCAL_INDEX_DIR):
+            return None
+        try:
+            return LocalVectorIndex(Config.LOCAL_INDEX_DIR)
+        except Exception as e:
+            print(f"Ошибка открытия локального индекса: {e}")
+            return None
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Статистика кэша поиска (None, если кэш не используется)"""
+        if self.use_llamaindex and isinstance(self.llama_client, CachedRetriever):
+            return self.llama_client.cache.stats()
+        return None
+
+    @staticmethod
+    def _candidates_k() -> int:
+        """Сколько кандидатов запрашивать у поиска"""
+        if RERANK_AVAILABLE and Config.RERANK_ENABLED:
+            return Config.RERANK_CANDIDATES
+        return 7
+
+    def _rank_sources(self, query: str, sources: list) -> list:
+        """Источники после сужения по индексу метаданных, дедупликации, переоценки и MMR"""
+        candidates = None
+        if self.metadata_index is not None:
+            if Config.METADATA_INDEX_LEARN:
+                # Статьи из выдачи пополняют индекс (дозапись только новых)
+                self.metadata_index.add_many(
+                    {"paper_id": source.paper_id, "title": source.title, "year": source.year}
+                    for source in sources
+                )
+            candidates = self.metadata_index.candidate_ids(query)
+
+        # Удалённый API не принимает фильтров, поэтому сужаем полученную выдачу:
+        # подходящие по индикаторам/темам/рынкам статьи поднимаются выше
+        if RERANK_AVAILABLE and Config.RERANK_ENABLED:
+            return rerank(query, sources, boost_ids=candidates)
+        if candidates:
+            sources = sorted(sources, key=lambda source: source.paper_id not in candidates)
+        return sources[:3]
+
+    @staticmethod
+    def indicator_query(indicator_name: str, timeframe: str = "any") -> str:
+        return f"торговые стратегии {indicator_name} технический анализ {timeframe if timeframe != 'any' else ''} условия входа выхода"
+
+    @staticmethod
+    def strategy_query(strategy: str) -> str:
+        return f"торговая стратегия {strategy} эффективность доходность риски"
+
+    @staticmethod
+    def market_sections(market_type: str, analysis_type: str = "technical") -> List[tuple]:
+        return [
+            ("Подходящие стратегии", f"торговые стратегии для {market_type} рынка {analysis_type} анализ"),
+            ("Риски и ограничения", f"риски и ограничения торговых стратегий на {market_type} рынке")
+        ]
+
+    def _retrieve(self, query: str, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """Поиск с тем же контрактом, что у клиента; готовый упреждающий результат берётся сразу"""
+        top_k = top_k or self._candidates_k()
+        if self.prefetcher is not None and top_k == self.prefetcher.top_k:
+            prefetched = self.prefetcher.claim(query)
+            if prefetched is not None:
+                return prefetched
+        # Тексты чанков инструментам не нужны: ответ уже в response
+        return self.llama_client.query(query, top_k=top_k, fields=DEFAULT_FIELDS)
+
+    def _retrieve_many(self, queries: List[str], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Параллельный поиск по нескольким запросам (время ≈ самый медленный запрос)"""
+        top_k = top_k or self._candidates_k()
+        if self.llama_client is self.local_index:
+            # Локальный индекс обрабатывает все запросы за один проход
+            return self.local_index.query_many(queries, top_k=top_k, fields=DEFAULT_FIELDS)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        if self.prefetcher is not None and top_k == self.prefetcher.top_k:
+            results = [self.prefetcher.claim(query) for query in queries]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            missing_queries = [queries[i] for i in missing]
+            if self.async_client is None:
+                fetched = [self.llama_client.query(query, top_k=top_k, fields=DEFAULT_FIELDS)
+                           for query in missing_queries]
+            else:
+                fetched = run_sync(self.async_client.aquery_many(missing_queries, top_k=top_k, fields=DEFAULT_FIELDS))
+            for i, result in zip(missing, fetched):
+                results[i] = result
+        return results
+
+    @staticmethod
+    def _format_sources(sources: list) -> str:
+        """Список названий статей-источников"""
+        lines = ""
+        for i, source in enumerate(sources, 1):
+            year = f" ({source.year})" if source.year else ""
+            lines += f"{i}. {source.display_title}{year}\n"
+        return lines
+
     def search_indicator_strategies(self, indicator_name: str, timeframe: str = "any") -> str:
         """Поиск торговых стратегий для технического индикатора"""
-        
+
         if not self.use_llamaindex:
             return f"""
 🔍 **Поиск стратегий для {indicator_name.upper()}** (Тестовый режим)
 
-⚠️ **Внимание:** LlamaIndex база знаний не подключена. 
+⚠️ **Внимание:** LlamaIndex база знаний не подключена.
 Для получения реальных данных из ArXiv статей настройте:
-- LLAMA_INDEX_URL 
+- LLAMA_INDEX_URL
 - LLAMA_INDEX_API_KEY
 
 **Пример стратегии {indicator_name.upper()}:**
@@ -40,17 +186,17 @@ class FinanceTools:
 - Продажа при RSI > 70 (перекупленность)
 - Используйте дополнительные фильтры для снижения ложных сигналов
 """
-        
+
         try:
-            query = f"торговые стратегии {indicator_name} технический анализ {timeframe if timeframe != 'any' else ''} условия входа выхода"
-            result = self.llama_client.query(query, top_k=7)
-            
+            query = self.indicator_query(indicator_name, timeframe)
+            result = self._retrieve(query)
+
             if result.get("error"):
                 return f"❌ Ошибка поиска в базе знаний: {result['error']}"
-            
+
             response = result.get("response", "")
             sources = result.get("source_nodes", [])
-            
+
             formatted_response = f"""
 📊 **Стратегии с использованием {indicator_name.upper()}** (из базы знаний ArXiv)
 
@@ -58,38 +204,132 @@ class FinanceTools:
 
 📚 **Источники из научных статей:**
 """
-            
-            for i, source in enumerate(sources[:3], 1):
-                if hasattr(source, 'metadata'):
-                    title = source.metadata.get('title', 'Неизвестная статья')
-                    formatted_response += f"{i}. {title}\n"
-            
+            formatted_response += self._format_sources(self._rank_sources(query, sources))
+
             return formatted_response
-            
+
         except Exception as e:
             return f"❌ Ошибка при работе с базой знаний: {str(e)}"
-    
+
     def compare_strategies(self, strategy1: str, strategy2: str) -> str:
         """Сравнение двух торговых стратегий"""
-        return f"🔍 Сравнение {strategy1} vs {strategy2} (тестовый режим)"
-    
+        if not self.use_llamaindex:
+            return f"🔍 Сравнение {strategy1} vs {strategy2} (тестовый режим)"
+
+        try:
+            # Оба поиска выполняются одновременно
+            queries = [self.strategy_query(strategy1), self.strategy_query(strategy2)]
+            results = self._retrieve_many(queries)
+
+            formatted_response = f"\n⚖️ **Сравнение {strategy1} vs {strategy2}** (из базы знаний ArXiv)\n"
+            for strategy, query, result in zip((strategy1, strategy2), queries, results):
+                formatted_response += f"\n### {strategy}\n"
+                if result.get("error"):
+                    formatted_response += f"❌ Ошибка поиска в базе знаний: {result['error']}\n"
+                    continue
+                formatted_response += f"{result.get('response', '')}\n\n📚 **Источники:**\n"
+                formatted_response += self._format_sources(
+                    self._rank_sources(query, result.get("source_nodes", []))
+                )
+
+            return formatted_response
+
+        except Exception as e:
+            return f"❌ Ошибка при работе с базой знаний: {str(e)}"
+
     def analyze_market_conditions(self, market_type: str, analysis_type: str = "technical") -> str:
         """Анализ стратегий для рыночных условий"""
-        return f"📈 Анализ для {market_type} рынка (тестовый режим)"
-    
+        if not self.use_llamaindex:
+            return f"📈 Анализ для {market_type} рынка (тестовый режим)"
+
+        try:
+            sections = self.market_sections(market_type, analysis_type)
+            results = self._retrieve_many([query for _, query in sections])
+
+            formatted_response = f"\n📈 **Анализ для {market_type} рынка ({analysis_type})** (из базы знаний ArXiv)\n"
+            for (title, query), result in zip(sections, results):
+                formatted_response += f"\n### {title}\n"
+                if result.get("error"):
+                    formatted_response += f"❌ Ошибка поиска в базе знаний: {result['error']}\n"
+                    continue
+                formatted_response += f"{result.get('response', '')}\n\n📚 **Источники:**\n"
+                formatted_response += self._format_sources(
+                    self._rank_sources(query, result.get("source_nodes", []))
+                )
+
+            return formatted_response
+
+        except Exception as e:
+            return f"❌ Ошибка при работе с базой знаний: {str(e)}"
+
+    @staticmethod
+    def _format_papers(papers: list) -> str:
+        """Список статей из индекса метаданных"""
+        lines = ""
+        for i, paper in enumerate(papers, 1):
+            year = f" ({paper.year})" if paper.year else ""
+            lines += f"{i}. {paper.title or paper.paper_id}{year} — {paper.paper_id}\n"
+        return lines
+
     def find_research_papers(self, topic: str, year_from: int = 2020) -> str:
         """Поиск научных исследований"""
-        return f"🔬 Поиск исследований по теме: {topic} (тестовый режим)"
-    
+        papers = []
+        if self.metadata_index is not None and len(self.metadata_index):
+            papers = self.metadata_index.search(topic, year_from=year_from, limit=Config.METADATA_SEARCH_LIMIT)
+        index_response = f"\n🔬 **Исследования по теме «{topic}» с {year_from} года** (индекс статей)\n\n"
+        # Индекс, построенный из полного корпуса, отвечает сам; неполный только дополняет поиск
+        if papers and (self.metadata_index.complete or not self.use_llamaindex):
+            return index_response + self._format_papers(papers)
+
+        if not self.use_llamaindex:
+            return f"🔬 Поиск исследований по теме: {topic} (тестовый режим)"
+
+        try:
+            query = f"научные исследования {topic} с {year_from} года"
+            result = self._retrieve(query)
+            if result.get("error"):
+                if papers:
+                    return index_response + self._format_papers(papers)
+                return f"❌ Ошибка поиска в базе знаний: {result['error']}"
+
+            # Статьи без года остаются, но после датированных
+            sources = [
+                source for source in result.get("source_nodes", [])
+                if source.year is None or source.year >= year_from
+            ]
+            sources.sort(key=lambda source: source.year is None)
+            ranked = self._rank_sources(query, sources)
+
+            formatted_response = f"""
+🔬 **Исследования по теме «{topic}» с {year_from} года** (из базы знаний ArXiv)
+
+{result.get("response", "")}
+
+📚 **Статьи:**
+"""
+            formatted_response += self._format_sources(ranked)
+            shown = {source.paper_id for source in ranked}
+            extra = [paper for paper in papers if paper.paper_id not in shown]
+            if extra:
+                formatted_response += "\n📑 **Также в индексе статей:**\n" + self._format_papers(extra)
+            return formatted_response
+
+        except Exception as e:
+            return f"❌ Ошибка при работе с базой знаний: {str(e)}"
+
     def get_tools(self):
         """Возвращает список инструментов для агента"""
+        # Схемы инструментов строятся один раз и переиспользуются всеми агентами
+        if self._tools is not None:
+            return self._tools
         try:
-            return [
+            self._tools = [
                 FunctionTool.from_defaults(self.search_indicator_strategies),
                 FunctionTool.from_defaults(self.compare_strategies),
                 FunctionTool.from_defaults(self.analyze_market_conditions),
                 FunctionTool.from_defaults(self.find_research_papers)
             ]
+            return self._tools
         except Exception as e:
             print(f"Ошибка создания инструментов: {e}")
             return []
@@ -0,0 +1,67 @@
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+
+from utils.tracing import tracer, current_turn_id
+
+
+def _usage(response: Any) -> Tuple[int, int]:
+    """Число токенов запроса и ответа из сырого ответа OpenAI"""
+    raw = getattr(response, "raw", None)
+    if raw is None:
+        return 0, 0
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Спаны для вызовов LLM и инструментов внутри ReAct цикла"""
+
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        # event_id -> (начало, turn_id, атрибуты); конец события может прийти из другого потока
+        self._events: Dict[str, Tuple[float, Optional[str], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def on_event_start(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None,
+                       event_id: str = "", parent_id: str = "", **kwargs: Any) -> str:
+        if event_type not in (CBEventType.LLM, CBEventType.FUNCTION_CALL):
+            return event_id
+
+        attrs: Dict[str, Any] = {}
+        if event_type == CBEventType.FUNCTION_CALL and payload:
+            tool = payload.get(EventPayload.TOOL)
+            attrs["tool"] = getattr(tool, "name", None)
+        with self._lock:
+            self._events[event_id] = (time.perf_counter(), current_turn_id(), attrs)
+        return event_id
+
+    def on_event_end(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None,
+                     event_id: str = "", **kwargs: Any) -> None:
+        with self._lock:
+            started = self._events.pop(event_id, None)
+        if started is None:
+            return
+
+        started_at, turn_id, attrs = started
+        if event_type == CBEventType.LLM:
+            response = (payload or {}).get(EventPayload.RESPONSE) or (payload or {}).get(EventPayload.COMPLETION)
+            attrs["prompt_tokens"], attrs["completion_tokens"] = _usage(response)
+            name = "llm"
+        else:
+            name = "tool"
+        tracer.record(name, (time.perf_counter() - started_at) * 1000, turn_id=turn_id, **attrs)
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None,
+                  trace_map: Optional[Dict[str, List[str]]] = None) -> None:
+        pass
@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, AsyncIterator
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from agents.pool import AgentPool, AgentLease, PoolSaturated
+from config import Config, validate_config
+from utils.tracing import tracer
+
+# Ходы агентов выполняются в отдельных потоках: LLM и поиск блокирующие
+_turn_executor = ThreadPoolExecutor(
+    max_workers=Config.API_MAX_CONCURRENT_TURNS,
+    thread_name_prefix="api-turn"
+)
+
+pool = AgentPool()
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    answer: str
+
+
+async def _evict_idle_sessions():
+    """Периодическое удаление простаивающих сессий"""
+    while True:
+        await asyncio.sleep(Config.API_EVICTION_INTERVAL)
+        pool.evict_idle()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    validate_config()
+    # Общие LLM и инструменты создаются до первого запроса, а не на нём
+    from agents.resources import get_llm, get_finance_tools
+
+    await asyncio.get_running_loop().run_in_executor(None, lambda: (get_llm(), get_finance_tools()))
+    eviction = asyncio.create_task(_evict_idle_sessions())
+    try:
+        yield
+    finally:
+        eviction.cancel()
+        prefetcher = get_finance_tools().prefetcher
+        if prefetcher is not None:
+            prefetcher.shutdown()
+
+
+app = FastAPI(title=Config.APP_TITLE, description=Config.APP_DESCRIPTION, lifespan=lifespan)
+
+
+def _saturated(error: PoolSaturated) -> HTTPException:
+    # 503 + Retry-After: балансировщик или клиент повторит запрос, возможно на другом экземпляре
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
+
+
+def _release_when_acquired(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
+
+
+async def _lease(session_id: str) -> AgentLease:
+    future = asyncio.get_running_loop().run_in_executor(None, pool.lease, session_id)
+    try:
+        return await asyncio.shield(future)
+    except PoolSaturated as e:
+        raise _saturated(e)
+    except asyncio.CancelledError:
+        # Запрос отменён, пока ждали слот: полученный позже агент сразу возвращается в пул
+        future.add_done_callback(_release_when_acquired)
+        raise
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """Ответ агента целиком"""
+    session_id = request.session_id or uuid.uuid4().hex
+    lease = await _lease(session_id)
+    try:
+        turn = _turn_executor.submit(lease.agent.chat, request.message)
+    except Exception:
+        lease.release()
+        raise
+    # Слот освобождается по завершении хода в его потоке: при отмене запроса агент ещё работает,
+    # и освобождение в finally пустило бы в ту же сессию второй ход
+    turn.add_done_callback(lambda _: lease.release())
+    answer = await asyncio.wrap_future(turn)
+    return ChatResponse(session_id=session_id, answer=answer)
+
+
+def _start_stream(lease: AgentLease, message: str) -> asyncio.Queue:
+    """Запуск stream_chat в потоке хода; события передаются в asyncio.Queue"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def produce():
+        # Ход целиком выполняется в одном потоке (turn_id трассировки живёт в его контексте).
+        # При обрыве соединения ход доигрывается до конца, чтобы память сессии осталась целой
+        try:
+            for event in lease.agent.stream_chat(message):
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, {"type": "error", "content": str(e)})
+        finally:
+            lease.release()
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    _turn_executor.submit(produce)
+    return queue
+
+
+async def _ndjson_events(queue: asyncio.Queue) -> AsyncIterator[bytes]:
+    """События хода построчно в NDJSON"""
+    while True:
+        event = await queue.get()
+        if event is None:
+            break
+        yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Потоковый ответ: шаги рассуждения и токены по мере готовности (NDJSON)"""
+    session_id = request.session_id or uuid.uuid4().hex
+    lease = await _lease(session_id)
+    # Ход запускается сразу: слот освобождается по его завершении, даже если клиент ушёл
+    queue = _start_stream(lease, request.message)
+    return StreamingResponse(
+        _ndjson_events(queue),
+        media_type="application/x-ndjson",
+        headers={"X-Session-Id": session_id}
+    )
+
+
+@app.get("/sessions/{session_id}/history")
+async def get_history(session_id: str):
+    """История разговора сессии"""
+    agent = pool.get(session_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    return {"session_id": session_id, "messages": agent.get_chat_history()}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Очистка истории: сессия удаляется из пула"""
+    return {"session_id": session_id, "removed": pool.remove(session_id)}
+
+
+@app.get("/health")
+async def health():
+    """Состояние пула агентов, упреждающего поиска и быстрого пути"""
+    from agents.resources import get_finance_tools
+
+    stats = pool.stats()
+    status = "saturated" if stats["active_turns"] >= stats["max_concurrent_turns"] else "ok"
+    prefetcher = get_finance_tools().prefetcher
+    if prefetcher is not None:
+        stats["prefetch"] = prefetcher.stats()
+    if Config.ROUTER_ENABLED:
+        from agents.router import get_router
+
+        stats["router"] = get_router().stats()
+    return JSONResponse({"status": status, **stats})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики трассировки в формате Prometheus"""
+    return PlainTextResponse(tracer.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api:app", host=Config.API_HOST, port=Config.API_PORT)
@@ -1,7 +1,7 @@
 import streamlit as st
 import os
+import time
 from config import Config, validate_config
-from agents.finance_agent import FinanceAnalysisAgent
 from utils.streamlit_utils import StreamlitUtils
 
 # Конфигурация страницы
@@ -23,19 +23,31 @@ def main():
     utils = StreamlitUtils()
     utils.init_session_state()
     
-    # Проверка конфигурации
-    try:
-        validate_config()
-    except ValueError as e:
-        st.error(f"❌ Ошибка конфигурации: {e}")
-        st.info("Убедитесь, что все переменные окружения настроены правильно.")
-        st.stop()
+    # Проверка конфигурации (в режиме клиента ключи нужны только серверу API)
+    if not Config.API_URL:
+        try:
+            validate_config()
+        except ValueError as e:
+            st.error(f"❌ Ошибка конфигурации: {e}")
+            st.info("Убедитесь, что все переменные окружения настроены правильно.")
+            st.stop()
     
     # Инициализация агента
     if st.session_state.agent is None:
         with st.spinner("🚀 Инициализация AI-ассистента..."):
             try:
-                st.session_state.agent = FinanceAnalysisAgent()
+                started = time.perf_counter()
+                if Config.API_URL:
+                    # Агент живёт на сервере API, здесь только клиент сессии
+                    from utils.api_client import ApiAgentClient
+
+                    st.session_state.agent = ApiAgentClient()
+                else:
+                    # Агент и LlamaIndex импортируются только при первой инициализации
+                    from agents.finance_agent import FinanceAnalysisAgent
+
+                    st.session_state.agent = FinanceAnalysisAgent()
+                st.session_state.agent_init_seconds = time.perf_counter() - started
                 st.success("✅ AI-ассистент готов к работе!")
             except Exception as e:
                 st.error(f"❌ Ошибка инициализации: {e}")
@@ -45,7 +57,7 @@ def main():
     quick_command = utils.create_sidebar()
     
     # В функции main() добавьте проверку
-    if st.button("🔍 Тест подключения к базе знаний"):
+    if not Config.API_URL and st.button("🔍 Тест подключения к базе знаний"):
         try:
             from utils.llama_client import LlamaIndexClient
             client = LlamaIndexClient()
@@ -55,7 +67,10 @@ def main():
                 st.error(f"❌ Ошибка: {result['error']}")
             else:
                 st.success("✅ Подключение к базе знаний работает!")
-                st.json(result)
+                st.json({
+                    **result,
+                    "source_nodes": [node.to_dict() for node in result.get("source_nodes", [])]
+                })
         except Exception as e:
             st.error(f"❌ Ошибка подключения: {e}")
     
@@ -63,9 +78,8 @@ def main():
     if not st.session_state.messages:
         utils.show_welcome()
     else:
-        # Отображение истории сообщений
-        for message in st.session_state.messages:
-            utils.display_message(message)
+        # Отображение истории сообщений (только последняя страница)
+        utils.show_history()
     
     # Обработка быстрой команды из sidebar
     if quick_command:
@@ -73,10 +87,9 @@ def main():
         utils.display_message({"role": "user", "content": quick_command})
         
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Анализирую..."):
-                response = st.session_state.agent.chat(quick_command)
-                formatted_response = utils.format_agent_response(response)
-                st.markdown(formatted_response)
+            formatted_response = utils.render_stream(
+                st.session_state.agent.stream_chat(quick_command)
+            )
         
         st.session_state.messages.append({"role": "assistant", "content": formatted_response})
         st.rerun()
@@ -89,15 +102,14 @@ def main():
         
         # Генерация ответа
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Анализирую исследования..."):
-                try:
-                    response = st.session_state.agent.chat(prompt)
-                    formatted_response = utils.format_agent_response(response)
-                    st.markdown(formatted_response)
-                except Exception as e:
-                    error_msg = f"❌ Произошла ошибка: {str(e)}"
-                    st.error(error_msg)
-                    formatted_response = error_msg
+            try:
+                formatted_response = utils.render_stream(
+                    st.session_state.agent.stream_chat(prompt)
+                )
+            except Exception as e:
+                error_msg = f"❌ Произошла ошибка: {str(e)}"
+                st.error(error_msg)
+                formatted_response = error_msg
         
         # Добавление ответа в историю
         st.session_state.messages.append({"role": "assistant", "content": formatted_response})
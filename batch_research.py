@@ -0,0 +1,151 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Set
+
+from config import Config, validate_config
+from utils.rate_limit import RateLimiter
+from utils.tokens import count_tokens
+
+
+def load_questions(path: str) -> List[Dict[str, str]]:
+    """Вопросы из JSONL ({"id", "question"}) или CSV (колонки id, question)"""
+    questions = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows: Iterator[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for number, row in enumerate(rows, start=1):
+            question = (row.get("question") or "").strip()
+            if not question:
+                continue
+            # Без id повторный запуск не смог бы сопоставить вопрос с результатом
+            question_id = str(row.get("id") or f"q{number}")
+            questions.append({"id": question_id, "question": question})
+    return questions
+
+
+def load_completed_ids(path: str) -> Set[str]:
+    """id вопросов, уже успешно записанных в выходной файл (для продолжения)"""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Последняя строка могла остаться недописанной при прерывании
+                continue
+            if record.get("status") == "ok":
+                completed.add(str(record.get("id")))
+    return completed
+
+
+def answer_question(item: Dict[str, str], limiter: RateLimiter, llm, tools) -> Dict[str, Any]:
+    """Ответ на один вопрос в отдельной сессии агента с общими LLM и инструментами"""
+    from agents.finance_agent import FinanceAnalysisAgent
+
+    waited = limiter.acquire(count_tokens(item["question"]) + Config.BATCH_TOKENS_PER_QUESTION)
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"id": item["id"], "question": item["question"]}
+
+    # Свежий агент на вопрос: вопросы пакета независимы и не должны делить историю
+    agent = FinanceAnalysisAgent(llm=llm, tools=tools)
+    answer, error = "", None
+    for event in agent.stream_chat(item["question"]):
+        if event["type"] == "done":
+            answer = event["content"]
+        elif event["type"] == "error":
+            error = event["content"]
+
+    record.update({
+        "status": "error" if error else "ok",
+        "answer": answer,
+        "error": error,
+        "duration_s": round(time.perf_counter() - started, 3),
+        "rate_limit_wait_s": round(waited, 3),
+        "finished_at": time.time()
+    })
+    return record
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int, limiter: RateLimiter) -> Dict[str, int]:
+    """Параллельная обработка вопросов с записью результатов по мере готовности"""
+    from agents.resources import get_llm, get_finance_tools
+
+    questions = load_questions(input_path)
+    completed = load_completed_ids(output_path)
+    pending = [item for item in questions if item["id"] not in completed]
+    print(f"Вопросов: {len(questions)}, уже готово: {len(questions) - len(pending)}, в работе: {len(pending)}")
+
+    llm = get_llm()
+    tools = get_finance_tools()
+    stats = {"ok": 0, "error": 0}
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            futures = {
+                executor.submit(answer_question, item, limiter, llm, tools): item for item in pending
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                item = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"id": item["id"], "question": item["question"], "status": "error",
+                              "answer": "", "error": str(e), "finished_at": time.time()}
+
+                # Каждая строка сразу сбрасывается на диск — это и есть контрольная точка
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                stats[record["status"]] += 1
+                print(f"[{done}/{len(pending)}] {record['status']:<5} {item['id']}")
+    except KeyboardInterrupt:
+        print("\nПрервано: готовые ответы сохранены, повторный запуск продолжит с этого места")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетные ответы на исследовательские вопросы без UI")
+    parser.add_argument("input", help="JSONL ({\"id\", \"question\"}) или CSV с колонками id, question")
+    parser.add_argument("output", help="JSONL с результатами (дописывается, служит контрольной точкой)")
+    parser.add_argument("--concurrency", type=int, default=Config.BATCH_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=Config.BATCH_REQUESTS_PER_MINUTE,
+                        help="Вопросов в минуту (0 — без ограничения)")
+    parser.add_argument("--tpm", type=float, default=Config.BATCH_TOKENS_PER_MINUTE,
+                        help="Оценка токенов LLM в минуту (0 — без ограничения)")
+    args = parser.parse_args()
+
+    try:
+        validate_config()
+    except ValueError as e:
+        print(f"❌ Ошибка конфигурации: {e}")
+        sys.exit(1)
+
+    limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    try:
+        stats = run_batch(args.input, args.output, max(1, args.concurrency), limiter)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"Готово: {stats['ok']} успешно, {stats['error']} с ошибкой")
+    sys.exit(1 if stats["error"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import json
+import time
+from typing import Any
+
+from llama_index.core.llms import (
+    CustomLLM,
+    CompletionResponse,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from config import Config
+
+# Сценарий ReAct: сначала один вызов инструмента, после наблюдения — финальный ответ
+ACTION_STEP = (
+    "Thought: The current language of the user is: Russian. I need to use a tool to help me answer the question.\n"
+    "Action: search_indicator_strategies\n"
+    "Action Input: {action_input}"
+)
+ANSWER_STEP = (
+    "Thought: I can answer without using any more tools. I'll use the user's language to answer\n"
+    "Answer: По данным исследований, стратегии на основе RSI чаще всего используют "
+    "уровни перекупленности и перепроданности с дополнительными фильтрами тренда."
+)
+SUMMARY_STEP = "Пользователь спрашивал о стратегиях на основе технических индикаторов."
+# Ответ быстрого пути: один вызов LLM по результату инструмента, без формата ReAct
+SYNTHESIS_STEP = (
+    "По данным исследований из базы знаний, стратегии на основе RSI используют уровни "
+    "перекупленности и перепроданности; риски — ложные сигналы в сильном тренде."
+)
+# Неизменная строка промпта синтеза (после подстановки результата инструмента)
+SYNTHESIS_MARKER = Config.ROUTER_SYNTHESIS_PROMPT.split("{observation}")[1].strip().splitlines()[0]
+
+
+class ScriptedLLM(CustomLLM):
+    """Детерминированная замена OpenAI для прогона ReAct цикла без сети"""
+
+    latency_ms: float = 0.0
+    indicator: str = "RSI"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=128000, num_output=512, model_name="scripted-llm")
+
+    def _script(self, prompt: str) -> str:
+        # Шаг выбирается по содержимому промпта, поэтому LLM можно делить между потоками
+        if "краткое содержание" in prompt.lower():
+            return SUMMARY_STEP
+        if SYNTHESIS_MARKER in prompt:
+            return SYNTHESIS_STEP
+        if "Observation:" in prompt:
+            return ANSWER_STEP
+        return ACTION_STEP.format(
+            action_input=json.dumps({"indicator_name": self.indicator, "timeframe": "daily"})
+        )
+
+    def _usage(self, prompt: str, text: str) -> Any:
+        return {"usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}}
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency_ms / 1000)
+        text = self._script(prompt)
+        return CompletionResponse(text=text, raw=self._usage(prompt, text))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        time.sleep(self.latency_ms / 1000)
+        text = self._script(prompt)
+        accumulated = ""
+        for word in text.split(" "):
+            delta = word if not accumulated else " " + word
+            accumulated += delta
+            yield CompletionResponse(text=accumulated, delta=delta)
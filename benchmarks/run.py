@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List
+
+from benchmarks.stub_server import StubLlamaIndexServer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+QUESTIONS = [
+    "Покажи мне стратегии связанные с RSI для дневной торговли",
+    "Сравни эффективность MACD и RSI в трендовых рынках",
+    "Какие стратегии подходят для волатильного рынка?",
+    "Расскажи о стратегиях mean reversion для криптовалют",
+]
+
+# Простые запросы с одним намерением: маршрутизатор обходит цикл ReAct
+FAST_PATH_QUESTIONS = [
+    "Покажи мне стратегии связанные с RSI для дневной торговли",
+    "Какие стратегии подходят для волатильного рынка?",
+    "Сравни momentum и contrarian стратегии",
+]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_benchmark(name: str, make_worker: Callable[[int], Callable[[int], Any]],
+                  users: int, iterations: int) -> Dict[str, float]:
+    """Нагрузка от users параллельных пользователей по iterations вызовов каждый"""
+    workers = [make_worker(user) for user in range(users)]
+
+    def run_load(first: int, count: int) -> List[float]:
+        def run_user(user: int) -> List[float]:
+            worker = workers[user]
+            timings = []
+            for i in range(first, first + count):
+                started = time.perf_counter()
+                worker(i)
+                timings.append((time.perf_counter() - started) * 1000)
+            return timings
+
+        timings: List[float] = []
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            for user_timings in executor.map(run_user, range(users)):
+                timings.extend(user_timings)
+        return timings
+
+    started = time.perf_counter()
+    latencies = run_load(0, iterations)
+    elapsed = time.perf_counter() - started
+
+    # tracemalloc замедляет каждую аллокацию, поэтому пик памяти — в отдельном прогоне без замеров времени;
+    # индексы продолжаются, чтобы не попадать в кэш по запросам основного прогона
+    tracemalloc.start()
+    run_load(iterations, max(1, iterations // 4))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    result = {
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p99_ms": _percentile(latencies, 0.99),
+        "peak_mb": peak / (1024 * 1024)
+    }
+    print(
+        f"{name:<24} {result['throughput']:>9.1f} ops/s  p50 {result['p50_ms']:>8.1f} ms  "
+        f"p99 {result['p99_ms']:>8.1f} ms  peak {result['peak_mb']:>7.1f} MB"
+    )
+    return result
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                          tolerance: float) -> List[str]:
+    """Список регрессий относительно сохранённого baseline"""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if current["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']:.1f} < {reference['throughput']:.1f}")
+        for metric in ("p50_ms", "p99_ms", "peak_mb"):
+            if current[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {current[metric]:.1f} > {reference[metric]:.1f}")
+    return regressions
+
+
+def _configure(server_url: str, use_cache: bool, cache_dir: str):
+    """Окружение для офлайн прогона: stub вместо LlamaIndex, без семантического кэша и быстрого пути"""
+    os.environ["LLAMA_INDEX_URL"] = server_url
+    os.environ["LLAMA_INDEX_API_KEY"] = "benchmark"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from config import Config
+    from utils.tracing import tracer
+
+    Config.RETRIEVAL_CACHE_ENABLED = use_cache
+    Config.RETRIEVAL_CACHE_PATH = os.path.join(cache_dir, "retrieval_cache.sqlite")
+    Config.ANSWER_CACHE_ENABLED = False
+    # agent.chat измеряет цикл ReAct; быстрый путь — отдельный бенчмарк agent.fast_path
+    Config.ROUTER_ENABLED = False
+    Config.LOCAL_INDEX_DIR = os.path.join(cache_dir, "no_local_index")
+    tracer.enabled = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарки LlamaIndexClient, FinanceTools и агента")
+    parser.add_argument("--users", type=int, default=8, help="Число параллельных пользователей")
+    parser.add_argument("--iterations", type=int, default=20, help="Вызовов на пользователя")
+    parser.add_argument("--server-latency-ms", type=float, default=50.0)
+    parser.add_argument("--text-size", type=int, default=2000, help="Размер текста чанка в ответе stub")
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0)
+    parser.add_argument("--only", default="client,tools,agent,fast_path", help="Список бенчмарков через запятую")
+    parser.add_argument("--with-cache", action="store_true", help="Не отключать кэш поиска")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    selected = set(args.only.split(","))
+    results: Dict[str, Dict[str, float]] = {}
+
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            StubLlamaIndexServer(latency_ms=args.server_latency_ms, text_size=args.text_size) as server:
+        _configure(server.url, args.with_cache, cache_dir)
+
+        if "client" in selected:
+            from utils.llama_client import LlamaIndexClient
+
+            client = LlamaIndexClient()
+            results["client.query"] = run_benchmark(
+                "client.query",
+                lambda user: lambda i: client.query(f"{QUESTIONS[i % len(QUESTIONS)]} {user}", top_k=7),
+                args.users, args.iterations
+            )
+
+        if "tools" in selected:
+            from agents.tools import FinanceTools
+
+            tools = FinanceTools()
+            results["tools.search"] = run_benchmark(
+                "tools.search",
+                lambda user: lambda i: tools.search_indicator_strategies(f"RSI{user}-{i}", "daily"),
+                args.users, args.iterations
+            )
+            results["tools.compare"] = run_benchmark(
+                "tools.compare",
+                lambda user: lambda i: tools.compare_strategies(f"MACD{user}-{i}", f"RSI{user}-{i}"),
+                args.users, args.iterations
+            )
+
+        if "agent" in selected:
+            from agents.finance_agent import FinanceAnalysisAgent
+            from agents.tools import FinanceTools
+            from benchmarks.fake_llm import ScriptedLLM
+
+            llm = ScriptedLLM(latency_ms=args.llm_latency_ms)
+            shared_tools = FinanceTools()
+
+            def make_agent_worker(user: int):
+                agent = FinanceAnalysisAgent(llm=llm, tools=shared_tools)
+                return lambda i: agent.chat(QUESTIONS[i % len(QUESTIONS)])
+
+            results["agent.chat"] = run_benchmark(
+                "agent.chat", make_agent_worker, args.users, max(1, args.iterations // 4)
+            )
+
+        if "fast_path" in selected:
+            from config import Config
+            from agents.finance_agent import FinanceAnalysisAgent
+            from agents.tools import FinanceTools
+            from benchmarks.fake_llm import ScriptedLLM
+
+            llm = ScriptedLLM(latency_ms=args.llm_latency_ms)
+            shared_tools = FinanceTools()
+
+            def make_fast_path_worker(user: int):
+                # Маршрутизатор включается только для агентов этого бенчмарка
+                Config.ROUTER_ENABLED = True
+                try:
+                    agent = FinanceAnalysisAgent(llm=llm, tools=shared_tools)
+                finally:
+                    Config.ROUTER_ENABLED = False
+                return lambda i: agent.chat(FAST_PATH_QUESTIONS[i % len(FAST_PATH_QUESTIONS)])
+
+            results["agent.fast_path"] = run_benchmark(
+                "agent.fast_path", make_fast_path_worker, args.users, max(1, args.iterations // 4)
+            )
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline сохранён: {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Регрессии производительности:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\n✅ Регрессий относительно baseline нет")
+
+
+if __name__ == "__main__":
+    main()
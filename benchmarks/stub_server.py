@@ -0,0 +1,116 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+# Небольшой словарь для правдоподобного текста чанков
+_WORDS = (
+    "RSI MACD momentum mean reversion volatility trend strategy returns "
+    "Sharpe drawdown backtest signal indicator market regime crossover"
+).split()
+
+
+def make_payload(query: str, top_k: int, text_size: int) -> Dict[str, Any]:
+    """Ответ в формате LlamaIndex API: response + source_nodes"""
+    text = " ".join(_WORDS[i % len(_WORDS)] for i in range(max(1, text_size // 8)))[:text_size]
+    return {
+        "response": f"Обзор исследований по запросу «{query}»: {text[:400]}",
+        "source_nodes": [
+            {
+                "text": text,
+                "score": round(1.0 - i / (top_k + 1), 4),
+                "metadata": {
+                    "title": f"Stub paper {i}",
+                    "paper_id": f"2401.{i:05d}",
+                    "year": 2019 + i % 6
+                }
+            }
+            for i in range(top_k)
+        ]
+    }
+
+
+class StubLlamaIndexServer:
+    """Локальная замена LlamaIndex API с настраиваемой задержкой и размером ответа"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 50.0,
+                 text_size: int = 2000, path: str = "/query"):
+        self.latency_ms = latency_ms
+        self.text_size = text_size
+        self.path = path
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+
+                # Остальные пути отвечают 404, как реальный сервер с одним endpoint
+                if self.path != server.path:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                time.sleep(server.latency_ms / 1000)
+                payload = json.dumps(
+                    make_payload(body.get("query", ""), int(body.get("top_k", 5)), server.text_size),
+                    ensure_ascii=False
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLlamaIndexServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный stub LlamaIndex API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--text-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = StubLlamaIndexServer(port=args.port, latency_ms=args.latency_ms, text_size=args.text_size)
+    print(f"Stub LlamaIndex API: {server.url}/query")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,62 @@ class Config:
     # LlamaIndex
     LLAMA_INDEX_URL = os.getenv("LLAMA_INDEX_URL")
     LLAMA_INDEX_API_KEY = os.getenv("LLAMA_INDEX_API_KEY")
+    LLAMA_INDEX_TIMEOUT = float(os.getenv("LLAMA_INDEX_TIMEOUT", "30"))
+    # Ответы больше порога разбираются потоково (если установлен ijson)
+    LLAMA_INDEX_STREAM_PARSE_BYTES = int(os.getenv("LLAMA_INDEX_STREAM_PARSE_BYTES", str(256 * 1024)))
+
+    # HTTP пул соединений (общий для всех сессий)
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+    RETRIEVAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "4"))
+
+    # Ограничение задержки поиска: дедлайн, повторы, хеджирование, размыкатель
+    RETRIEVAL_DEADLINE = float(os.getenv("RETRIEVAL_DEADLINE", "10"))
+    RETRIEVAL_MAX_RETRIES = int(os.getenv("RETRIEVAL_MAX_RETRIES", "2"))
+    RETRIEVAL_BACKOFF_BASE = float(os.getenv("RETRIEVAL_BACKOFF_BASE", "0.2"))
+    RETRIEVAL_BACKOFF_MAX = float(os.getenv("RETRIEVAL_BACKOFF_MAX", "2.0"))
+    RETRIEVAL_HEDGE_ENABLED = os.getenv("RETRIEVAL_HEDGE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_HEDGE_PERCENTILE = float(os.getenv("RETRIEVAL_HEDGE_PERCENTILE", "0.95"))
+    RETRIEVAL_HEDGE_MIN_SAMPLES = int(os.getenv("RETRIEVAL_HEDGE_MIN_SAMPLES", "20"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # Кэш результатов поиска
+    RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_CACHE_PATH = os.getenv("RETRIEVAL_CACHE_PATH", ".cache/retrieval_cache.sqlite")
+    RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "5000"))
+    RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Локальный индекс чанков ArXiv (офлайн поиск)
+    LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+    LOCAL_INDEX_DIM = int(os.getenv("LOCAL_INDEX_DIM", "1024"))
+    LOCAL_INDEX_BATCH_ROWS = int(os.getenv("LOCAL_INDEX_BATCH_ROWS", "65536"))
+    LOCAL_INDEX_MIN_SCORE = float(os.getenv("LOCAL_INDEX_MIN_SCORE", "0.05"))
+
+    # Индекс метаданных статей (python -m utils.metadata_index corpus.jsonl)
+    METADATA_INDEX_ENABLED = os.getenv("METADATA_INDEX_ENABLED", "true").lower() == "true"
+    METADATA_INDEX_PATH = os.getenv("METADATA_INDEX_PATH", "data/metadata_index.jsonl")
+    # Пополнение индекса статьями из выдачи поиска (неполный индекс только дополняет поиск)
+    METADATA_INDEX_LEARN = os.getenv("METADATA_INDEX_LEARN", "false").lower() == "true"
+    METADATA_SEARCH_LIMIT = int(os.getenv("METADATA_SEARCH_LIMIT", "10"))
+
+    # Переранжирование источников: дедупликация по статьям, MMR, бюджет токенов
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+    # Инструменты запрашивают без текста чанков (только названия), поэтому кандидатов
+    # столько же, сколько без переранжирования: больше — только рост ответа API
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "7"))
+    RERANK_MAX_SOURCES = int(os.getenv("RERANK_MAX_SOURCES", "5"))
+    RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "200"))
+    RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+    RERANK_SCORE_WEIGHT = float(os.getenv("RERANK_SCORE_WEIGHT", "0.6"))
+    # Надбавка к релевантности статей, подходящих по индексу метаданных
+    RERANK_CANDIDATE_BOOST = float(os.getenv("RERANK_CANDIDATE_BOOST", "0.3"))
+
+    # Семантический кэш ответов агента
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.75"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
     
     # App settings
     APP_TITLE = os.getenv("APP_TITLE", "ArXiv Finance Research Assistant")
@@ -22,6 +78,10 @@ class Config:
     
     # Chat settings
     MAX_HISTORY = 50
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "500"))
+    # Сообщений на странице истории чата в Streamlit
+    CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
     SYSTEM_PROMPT = """
     Ты эксперт-аналитик по финансовым рынкам и специалист по научным 
     исследованиям в области финансов из ArXiv.
@@ -41,11 +101,105 @@ class Config:
     - Отвечай на русском языке, но технические термины можешь оставлять на английском
     """
 
+    # Подсказки для начала разговора (FinanceAnalysisAgent.get_suggestions)
+    SUGGESTIONS = [
+        "Покажи мне стратегии связанные с RSI для дневной торговли",
+        "Сравни эффективность MACD и RSI в трендовых рынках",
+        "Какие стратегии подходят для волатильного рынка?",
+        "Найди исследования по behavioral finance за последние 3 года",
+        "Расскажи о стратегиях mean reversion для криптовалют",
+        "Какие алгоритмические стратегии показывают лучшие результаты?",
+        "Анализ стратегий для sideways рынка с техническим подходом",
+        "Сравни momentum и contrarian стратегии"
+    ]
+    # Быстрые команды боковой панели Streamlit
+    QUICK_COMMANDS = [
+        "вилкой в глаз или в жопу раз",
+        "куда сам сядеш а куда мать посадиш",
+        "нормально делай нормально будет",
+        "искали искали и нашли"
+    ]
+
+    # Упреждающий поиск: прогрев подсказок при старте и вероятных запросов инструментов во время хода
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    PREFETCH_WARMUP = os.getenv("PREFETCH_WARMUP", "true").lower() == "true"
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+    PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", "8"))
+    PREFETCH_MAX_RESULTS = int(os.getenv("PREFETCH_MAX_RESULTS", "64"))
+    PREFETCH_MAX_PER_TURN = int(os.getenv("PREFETCH_MAX_PER_TURN", "4"))
+    PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "300"))
+
+    # Быстрый путь: простой запрос -> один вызов инструмента + один вызов LLM вместо цикла ReAct
+    ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+    ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.3"))
+    ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.03"))
+    ROUTER_MAX_WORDS = int(os.getenv("ROUTER_MAX_WORDS", "20"))
+    ROUTER_SYNTHESIS_PROMPT = """
+    Вопрос пользователя:
+    {question}
+
+    Результат инструмента {tool} (данные из научных статей ArXiv):
+    {observation}
+
+    Ответь на вопрос, опираясь только на этот результат. Сошлись на статьи-источники,
+    укажи ограничения и риски. Если данных недостаточно, так и скажи.
+    """
+
+    # Бюджет токенов на наблюдения инструментов (на инструмент и на ход агента)
+    CONTEXT_BUDGET_ENABLED = os.getenv("CONTEXT_BUDGET_ENABLED", "true").lower() == "true"
+    TOOL_OBSERVATION_TOKENS = int(os.getenv("TOOL_OBSERVATION_TOKENS", "700"))
+    TOOL_OBSERVATION_BUDGETS = os.getenv(
+        "TOOL_OBSERVATION_BUDGETS", "compare_strategies=1000,analyze_market_conditions=1000"
+    )
+    TURN_OBSERVATION_TOKENS = int(os.getenv("TURN_OBSERVATION_TOKENS", "3000"))
+
+    # Параллельное выполнение инструментов в одном шаге ReAct
+    PARALLEL_TOOLS_ENABLED = os.getenv("PARALLEL_TOOLS_ENABLED", "true").lower() == "true"
+    PARALLEL_TOOLS_MAX_WORKERS = int(os.getenv("PARALLEL_TOOLS_MAX_WORKERS", "8"))
+    PARALLEL_TOOLS_MAX_CALLS = int(os.getenv("PARALLEL_TOOLS_MAX_CALLS", "4"))
+    PARALLEL_TOOLS_PROMPT = """
+    Если для ответа нужны несколько независимых поисков (например, по разным
+    индикаторам или рынкам), вызывай их одним действием через run_tools_parallel,
+    а не по одному на каждом шаге.
+    """
+
+    # Трассировка и метрики
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_PATH = os.getenv("TRACE_PATH", ".cache/traces.jsonl")
+    # Ротация JSONL трассировки: размер файла и число старых файлов (traces.jsonl.1, .2, ...)
+    TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+    TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+    METRICS_PATH = os.getenv("METRICS_PATH", ".cache/metrics.prom")
+
+    # HTTP API с пулом агентов (api.py); при заданном API_URL Streamlit работает как тонкий клиент
+    API_URL = os.getenv("API_URL", "")
+    API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "1000"))
+    API_SESSION_IDLE_TIMEOUT = float(os.getenv("API_SESSION_IDLE_TIMEOUT", "1800"))
+    API_MAX_CONCURRENT_TURNS = int(os.getenv("API_MAX_CONCURRENT_TURNS", "16"))
+    API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "2"))
+    API_EVICTION_INTERVAL = float(os.getenv("API_EVICTION_INTERVAL", "60"))
+
+    # Пакетный режим (batch_research.py)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_REQUESTS_PER_MINUTE = float(os.getenv("BATCH_REQUESTS_PER_MINUTE", "60"))
+    BATCH_TOKENS_PER_MINUTE = float(os.getenv("BATCH_TOKENS_PER_MINUTE", "200000"))
+    # Оценка токенов на вопрос (ReAct ход с поиском) для лимитера
+    BATCH_TOKENS_PER_QUESTION = int(os.getenv("BATCH_TOKENS_PER_QUESTION", "6000"))
+
+def local_index_built() -> bool:
+    """Построен ли локальный индекс: index.json записывается последним (utils/local_index.py)"""
+    return os.path.isfile(os.path.join(Config.LOCAL_INDEX_DIR, "index.json"))
+
 # Валидация конфигурации
 def validate_config():
     if not Config.OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY не найден в переменных окружения")
+    # С построенным локальным индексом удалённый API не обязателен (офлайн режим)
+    if local_index_built():
+        return
     if not Config.LLAMA_INDEX_URL:
-        raise ValueError("LLAMA_INDEX_URL не найден в переменных окружения")
+        raise ValueError("LLAMA_INDEX_URL не найден в переменных окружения (или постройте локальный индекс)")
     if not Config.LLAMA_INDEX_API_KEY:
         raise ValueError("LLAMA_INDEX_API_KEY не найден в переменных окружения")
@@ -0,0 +1,15 @@
+import pytest
+
+from utils.tracing import tracer
+
+
+@pytest.fixture(autouse=True)
+def _trace_to_tmp(tmp_path, monkeypatch):
+    """Общий трассировщик пишет во временный каталог, а не в .cache репозитория"""
+    monkeypatch.setattr(tracer, "trace_path", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracer, "metrics_path", str(tmp_path / "metrics.prom"))
+    monkeypatch.setattr(tracer, "_file", None)
+    yield
+    if tracer._file is not None:
+        tracer._file.close()
+        tracer._file = None
@@ -0,0 +1,24 @@
+from agents.answer_cache import SemanticAnswerCache
+
+
+def _cache(question: str) -> SemanticAnswerCache:
+    cache = SemanticAnswerCache(threshold=0.5, max_entries=8, ttl_seconds=60)
+    cache.store(question, "answer")
+    return cache
+
+
+def test_qualifiers_must_match():
+    cache = _cache("Какие стратегии подходят для волатильного рынка?")
+    assert cache.lookup("Какие стратегии подходят для волатильного рынка") == "answer"
+    assert cache.lookup("Какие стратегии подходят для бокового рынка?") is None
+    assert cache.lookup("Какие стратегии подходят для трендового рынка?") is None
+    assert cache.lookup("Какие стратегии НЕ подходят для волатильного рынка?") is None
+
+
+def test_timeframe_must_match():
+    cache = _cache("Покажи стратегии RSI для дневной торговли")
+    assert cache.lookup("стратегии RSI для недельной торговли") is None
+
+
+def test_zero_threshold_is_kept():
+    assert SemanticAnswerCache(threshold=0.0, max_entries=2).threshold == 0.0
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from config import Config, validate_config
+from utils.local_index import build_index
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(Config, "LLAMA_INDEX_URL", None)
+    monkeypatch.setattr(Config, "LLAMA_INDEX_API_KEY", None)
+    monkeypatch.setattr(Config, "LOCAL_INDEX_DIR", str(tmp_path / "local_index"))
+    return tmp_path
+
+
+def test_starts_without_url_when_local_index_is_built(offline):
+    corpus = offline / "corpus.jsonl"
+    corpus.write_text(json.dumps({"text": "RSI divergence", "metadata": {"title": "RSI"}}) + "\n", encoding="utf-8")
+    build_index(str(corpus), Config.LOCAL_INDEX_DIR)
+    validate_config()
+
+
+def test_url_required_without_local_index(offline):
+    with pytest.raises(ValueError, match="LLAMA_INDEX_URL"):
+        validate_config()
@@ -0,0 +1,35 @@
+from utils.metadata_index import MetadataIndex
+
+
+def _index():
+    index = MetadataIndex()
+    index.add_many([
+        {"paper_id": "a", "title": "RSI divergence signals", "year": 2021},
+        {"paper_id": "b", "title": "Momentum in equity markets", "year": 2022},
+        {"paper_id": "c", "title": "Order book dynamics", "year": 2019},
+    ], persist=False)
+    return index
+
+
+def test_text_without_match_terms_finds_nothing():
+    index = _index()
+    assert index.search("ESG", year_from=2020) == []
+    assert index.search("AI") == []
+
+
+def test_empty_text_returns_year_range():
+    index = _index()
+    assert {record.paper_id for record in index.search("", year_from=2020)} == {"a", "b"}
+
+
+def test_only_corpus_built_index_is_complete(tmp_path):
+    path = str(tmp_path / "index.jsonl")
+    learned = MetadataIndex(path)
+    learned.add({"paper_id": "a", "title": "RSI divergence signals", "year": 2021})
+    assert not MetadataIndex.load(path).complete
+
+    built = _index()
+    built.complete = True
+    built.save(path)
+    loaded = MetadataIndex.load(path)
+    assert loaded.complete and len(loaded) == 3
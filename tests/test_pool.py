@@ -0,0 +1,30 @@
+from agents.pool import AgentPool
+
+
+def _pool(max_sessions=1) -> AgentPool:
+    return AgentPool(max_sessions=max_sessions, idle_timeout=60, max_concurrent_turns=4,
+                     queue_timeout=0.1, agent_factory=object)
+
+
+def test_leased_sessions_are_not_evicted():
+    pool = _pool()
+    first = pool.lease("a")
+    second = pool.lease("b")
+
+    assert pool.get("a") is first.agent
+    assert pool.get("b") is second.agent
+    first.release()
+    second.release()
+
+    pool.lease("c").release()
+    assert pool.stats()["sessions"] == 1
+
+
+def test_session_is_kept_between_lookup_and_lock():
+    pool = _pool()
+    pool.lease("a").release()
+    # Ход сессии «a» нашёл её, но ещё не взял блокировку
+    session = pool._get_session("a")
+    pool.lease("b").release()
+
+    assert pool.get("a") is session.agent
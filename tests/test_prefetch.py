@@ -0,0 +1,54 @@
+from agents.prefetch import Prefetcher
+from agents.router import IntentRouter
+from config import Config
+
+
+class _Tools:
+    """Построители запросов с той же сигнатурой, что у FinanceTools"""
+
+    llama_client = None
+
+    @staticmethod
+    def indicator_query(indicator_name, timeframe="any"):
+        return f"indicator {indicator_name} {timeframe}"
+
+    @staticmethod
+    def strategy_query(strategy):
+        return f"strategy {strategy}"
+
+    @staticmethod
+    def market_sections(market_type, analysis_type="technical"):
+        return [("fit", f"market {market_type} {analysis_type}"), ("risk", f"risks {market_type}")]
+
+
+def _tool_queries(route):
+    tools = _Tools()
+    if route.tool == "search_indicator_strategies":
+        return [tools.indicator_query(**route.args)]
+    if route.tool == "analyze_market_conditions":
+        return [query for _, query in tools.market_sections(**route.args)]
+    if route.tool == "compare_strategies":
+        return [tools.strategy_query(route.args["strategy1"]), tools.strategy_query(route.args["strategy2"])]
+    return []
+
+
+def test_speculative_queries_match_routed_tool_calls():
+    prefetcher = Prefetcher(_Tools(), top_k=7, max_workers=1)
+    router = IntentRouter(min_similarity=0.0, min_margin=0.0)
+    try:
+        for message in Config.SUGGESTIONS:
+            route = router.route(message)
+            if route.tool in ("search_indicator_strategies", "analyze_market_conditions", "compare_strategies"):
+                speculative = prefetcher.speculative_queries(message)
+                assert set(_tool_queries(route)) <= set(speculative), message
+    finally:
+        prefetcher.shutdown()
+
+
+def test_timeframe_and_canonical_market():
+    prefetcher = Prefetcher(_Tools(), top_k=7, max_workers=1)
+    try:
+        assert "indicator rsi intraday" in prefetcher.speculative_queries("стратегии RSI для дневной торговли")
+        assert "market volatile technical" in prefetcher.speculative_queries("стратегии для волатильного рынка")
+    finally:
+        prefetcher.shutdown()
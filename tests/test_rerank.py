@@ -0,0 +1,25 @@
+from utils.rerank import rerank
+from utils.source_nodes import SourceNode
+
+
+def _nodes():
+    return [
+        SourceNode(title="RSI thresholds for daily trading", paper_id="a", score=0.90),
+        SourceNode(title="Volatility regimes in equity markets", paper_id="b", score=0.89),
+        SourceNode(title="Factor investing across regions", paper_id="c", score=0.885),
+        SourceNode(title="Oscillator signals and market crashes", paper_id="d", score=0.88),
+    ]
+
+
+def _order(**kwargs):
+    return [node.paper_id for node in rerank("RSI trading", _nodes(), max_nodes=4, token_budget=1000, **kwargs)]
+
+
+def test_metadata_candidate_moves_up():
+    plain = _order(boost=0.0)
+    boosted = _order(boost_ids={"d"})
+    assert boosted.index("d") < plain.index("d")
+
+
+def test_no_candidates_keeps_order():
+    assert _order(boost_ids=set()) == _order(boost=0.0)
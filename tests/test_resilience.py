@@ -0,0 +1,63 @@
+import time
+
+from utils.resilience import CircuitBreaker, ResilientRetriever
+
+
+class _Backend:
+    """Backend, отвечающий заданными результатами по очереди"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def query(self, query, top_k, similarity_threshold, timeout=None, fields=None):
+        self.calls += 1
+        return dict(self.results.pop(0) if len(self.results) > 1 else self.results[0])
+
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    breaker._opened_at -= 1.0
+    return breaker
+
+
+def test_non_retryable_probe_closes_half_open_breaker():
+    breaker = _open_breaker()
+    backend = _Backend(
+        {"error": "HTTP 400", "retryable": False, "response": None, "source_nodes": []},
+        {"response": "ok", "source_nodes": []}
+    )
+    retriever = ResilientRetriever(backend, breaker=breaker)
+
+    assert retriever.query("rsi")["error"] == "HTTP 400"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    result = retriever.query("rsi")
+    assert result["response"] == "ok"
+    assert backend.calls == 2
+
+
+def test_half_open_allows_single_probe():
+    breaker = _open_breaker()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_attempt_is_bounded_by_deadline():
+    class _Trickling:
+        def query(self, query, top_k, similarity_threshold, timeout=None, fields=None):
+            # Медленное потоковое тело: таймаут чтения не срабатывает, пока байты идут
+            time.sleep(0.5)
+            return {"response": "late", "source_nodes": []}
+
+    retriever = ResilientRetriever(_Trickling(), breaker=CircuitBreaker(failure_threshold=5))
+    retriever.deadline = 0.1
+    started = time.monotonic()
+    result = retriever.query("rsi")
+    assert time.monotonic() - started < 0.3
+    assert result["retryable"]
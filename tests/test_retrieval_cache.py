@@ -0,0 +1,30 @@
+from utils.retrieval_cache import CachedRetriever, RetrievalCache
+
+
+class _Client:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def query(self, query, top_k, similarity_threshold, fields=None):
+        self.calls += 1
+        return dict(self.result)
+
+
+def test_degraded_results_are_not_cached():
+    for flag in ("stale", "fallback"):
+        client = _Client({"response": "old", "source_nodes": [], flag: True})
+        retriever = CachedRetriever(client, RetrievalCache(":memory:"))
+
+        retriever.query("rsi", top_k=7)
+        retriever.query("rsi", top_k=7)
+        assert client.calls == 2
+
+
+def test_fresh_results_are_cached():
+    client = _Client({"response": "fresh", "source_nodes": []})
+    retriever = CachedRetriever(client, RetrievalCache(":memory:"))
+
+    retriever.query("rsi", top_k=7)
+    assert retriever.query("rsi", top_k=7)["cache_hit"]
+    assert client.calls == 1
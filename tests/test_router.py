@@ -0,0 +1,30 @@
+from agents.router import IntentRouter
+
+
+def test_unsupported_years_go_to_agent():
+    router = IntentRouter(min_similarity=0.0, min_margin=0.0)
+    for message in ("исследования по RSI до 2015 года",
+                    "исследования по momentum с 2019 по 2021 год",
+                    "research papers on pairs trading 2015-2018",
+                    "исследования по RSI за 2023 год",
+                    "стратегии MACD в 2022 году"):
+        route = router.route(message)
+        assert not route.fast_path
+        assert route.reason == "unsupported_slot"
+
+
+def test_lower_year_bound_is_routed():
+    router = IntentRouter(min_similarity=0.0, min_margin=0.0)
+    route = router.route("исследования по pairs trading с 2019 года")
+    assert route.tool == "find_research_papers"
+    assert route.args == {"topic": "pairs trading", "year_from": 2019}
+
+
+def test_negated_term_goes_to_agent():
+    router = IntentRouter(min_similarity=0.0, min_margin=0.0)
+    for message in ("стратегии без RSI для интрадей",
+                    "исследования по трейдингу кроме momentum",
+                    "strategies without MACD"):
+        route = router.route(message)
+        assert not route.fast_path
+        assert route.reason == "negation"
@@ -0,0 +1,50 @@
+import os
+import threading
+
+from utils.tracing import Tracer
+
+
+def _tracer(tmp_path) -> Tracer:
+    tracer = Tracer(trace_path=str(tmp_path / "traces.jsonl"), metrics_path=str(tmp_path / "metrics.prom"))
+    tracer.enabled = True
+    return tracer
+
+
+def test_trace_file_is_rotated(tmp_path):
+    tracer = _tracer(tmp_path)
+    tracer.max_bytes = 500
+    tracer.backups = 2
+    for i in range(100):
+        tracer.record("retrieval", 1.0, query=f"q{i}")
+    tracer.flush()
+
+    assert os.path.getsize(tmp_path / "traces.jsonl") < 500
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert (tmp_path / "traces.jsonl.2").exists()
+    assert not (tmp_path / "traces.jsonl.3").exists()
+
+
+def test_concurrent_metrics_writes(tmp_path):
+    tracer = _tracer(tmp_path)
+    tracer.record("turn", 5.0)
+    threads = [threading.Thread(target=tracer.write_prometheus) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert "finance_agent_turn_duration_ms" in (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_live_file_is_reopened_after_rotation(tmp_path):
+    tracer = _tracer(tmp_path)
+    # Каждая запись превышает предел, поэтому последняя тоже вызывает ротацию
+    tracer.max_bytes = 1
+    tracer.backups = 1
+    for i in range(3):
+        tracer.record("retrieval", 1.0, query=f"q{i}")
+    tracer.flush()
+
+    assert os.path.getsize(tmp_path / "traces.jsonl") == 0
+    assert "q2" in (tmp_path / "traces.jsonl.1").read_text(encoding="utf-8")
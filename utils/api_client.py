@@ -0,0 +1,76 @@
+import json
+import uuid
+from typing import List, Dict, Iterator, Optional
+
+import requests
+
+from config import Config
+from utils.llama_client import get_http_session
+
+
+class ApiAgentClient:
+    """Тонкий клиент HTTP API (api.py) с интерфейсом FinanceAnalysisAgent для Streamlit"""
+
+    def __init__(self, base_url: Optional[str] = None, session_id: Optional[str] = None):
+        self.base_url = (base_url or Config.API_URL).rstrip("/")
+        self.session_id = session_id or uuid.uuid4().hex
+        self.session = get_http_session()
+
+    def _error_text(self, response: requests.Response) -> str:
+        if response.status_code == 503:
+            return "Сервер перегружен, повторите запрос через несколько секунд"
+        try:
+            return response.json().get("detail") or f"HTTP {response.status_code}"
+        except ValueError:
+            return f"HTTP {response.status_code}"
+
+    def stream_chat(self, message: str) -> Iterator[Dict[str, str]]:
+        """События хода из /chat/stream (те же, что у FinanceAnalysisAgent.stream_chat)"""
+        try:
+            with self.session.post(
+                f"{self.base_url}/chat/stream",
+                json={"message": message, "session_id": self.session_id},
+                # Заголовок для sticky-маршрутизации на балансировщике
+                headers={"X-Session-Id": self.session_id},
+                stream=True,
+                timeout=(5, Config.LLAMA_INDEX_TIMEOUT * 4)
+            ) as response:
+                if response.status_code != 200:
+                    yield {"type": "error", "content": self._error_text(response)}
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        yield json.loads(line)
+        except requests.exceptions.RequestException as e:
+            yield {"type": "error", "content": f"Ошибка подключения к API: {str(e)}"}
+
+    def chat(self, message: str) -> str:
+        """Ответ агента целиком"""
+        answer = ""
+        for event in self.stream_chat(message):
+            if event["type"] in ("done", "error"):
+                answer = event["content"]
+        return answer
+
+    def get_chat_history(self) -> List[Dict[str, str]]:
+        """История сессии на сервере"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/sessions/{self.session_id}/history",
+                headers={"X-Session-Id": self.session_id}, timeout=5
+            )
+            if response.status_code == 200:
+                return response.json().get("messages", [])
+        except requests.exceptions.RequestException:
+            pass
+        return []
+
+    def clear_history(self):
+        """Удаление сессии на сервере; следующий ход начнёт новую"""
+        try:
+            self.session.delete(
+                f"{self.base_url}/sessions/{self.session_id}",
+                headers={"X-Session-Id": self.session_id}, timeout=5
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Ошибка очистки сессии API: {e}")
@@ -0,0 +1,27 @@
+import asyncio
+import threading
+from typing import Any, Awaitable
+
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """Выполняет корутину из синхронного кода (в том числе внутри работающего event loop)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Уже внутри event loop (например, async-агент) — запускаем в отдельном потоке
+    result = {}
+
+    def runner():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
@@ -1,70 +1,248 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3Error, ReadTimeoutError
+import asyncio
+import contextvars
+import functools
 import json
-from typing import Dict, Any, Optional
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Sequence, Tuple
 import os
 
+from config import Config
+from utils.source_nodes import IJSON_AVAILABLE, parse_result_stream, parse_source_nodes
+from utils.tracing import tracer
+
+# Общий keep-alive пул соединений для всех клиентов и сессий Streamlit
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Найденные рабочие endpoint'ы: base_url -> endpoint
+_endpoint_cache: Dict[str, str] = {}
+_endpoint_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Возвращает общий HTTP пул соединений (создаётся один раз на процесс)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                    max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
 class LlamaIndexClient:
     """Клиент для работы с LlamaIndex API"""
-    
+
     def __init__(self):
         self.base_url = os.getenv("LLAMA_INDEX_URL")
         self.api_key = os.getenv("LLAMA_INDEX_API_KEY")
-        
+
         if not self.base_url:
             raise ValueError("LLAMA_INDEX_URL не найден в переменных окружения")
         if not self.api_key:
             raise ValueError("LLAMA_INDEX_API_KEY не найден в переменных окружения")
-            
+
         self.base_url = self.base_url.rstrip('/')
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-    
-    def query(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6) -> Dict[str, Any]:
-        """Выполнение запроса к LlamaIndex"""
+        self.timeout = Config.LLAMA_INDEX_TIMEOUT
+        self.session = get_http_session()
+
+    def _candidate_endpoints(self) -> List[str]:
+        """Возможные пути API в порядке приоритета"""
+        return [
+            f"{self.base_url}/query",
+            f"{self.base_url}/chat",
+            f"{self.base_url}/v1/query",
+            f"{self.base_url}"
+        ]
+
+    def _post(self, endpoint: str, payload: Dict[str, Any], timeout: float,
+              fields: Optional[Sequence[str]] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Один запрос к endpoint: (результат, None) или (None, причина отказа)"""
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                endpoint,
+                headers=self.headers,
+                json=payload,
+                timeout=timeout,
+                stream=True
+            )
+        except requests.exceptions.Timeout as e:
+            tracer.record("http", (time.perf_counter() - started) * 1000,
+                          endpoint=endpoint, status=None, error=type(e).__name__)
+            return None, "timeout"
+        except requests.exceptions.RequestException as e:
+            tracer.record("http", (time.perf_counter() - started) * 1000,
+                          endpoint=endpoint, status=None, error=type(e).__name__)
+            return None, "connection"
+
+        with response:
+            if response.status_code != 200:
+                tracer.record("http", (time.perf_counter() - started) * 1000,
+                              endpoint=endpoint, status=response.status_code)
+                return None, f"status:{response.status_code}"
+
+            # Тело разбирается один раз; большие ответы — потоково, без полной копии в памяти
+            length = int(response.headers.get("Content-Length") or 0)
+            try:
+                if IJSON_AVAILABLE and (length == 0 or length >= Config.LLAMA_INDEX_STREAM_PARSE_BYTES):
+                    response.raw.decode_content = True
+                    result = parse_result_stream(response.raw, fields)
+                else:
+                    body = response.content
+                    length = len(body)
+                    data = json.loads(body)
+                    result = None
+                    if isinstance(data, dict):
+                        result = {
+                            "response": data.get("response", ""),
+                            "source_nodes": parse_source_nodes(data.get("source_nodes", []), fields)
+                        }
+            except (requests.exceptions.Timeout, ReadTimeoutError):
+                return None, "timeout"
+            except (requests.exceptions.RequestException, Urllib3Error):
+                # При потоковом разборе обрыв приходит из urllib3 напрямую
+                return None, "connection"
+            except ValueError:
+                result = None
+            finally:
+                tracer.record("http", (time.perf_counter() - started) * 1000,
+                              endpoint=endpoint, status=response.status_code, bytes=length)
+
+        if result is None:
+            return None, "invalid"
+        result["endpoint_used"] = endpoint
+        return result, None
+
+    @staticmethod
+    def _is_retryable(failure: Optional[str]) -> bool:
+        """Временные сбои: таймаут, обрыв соединения, 429 и 5xx"""
+        if failure in ("timeout", "connection"):
+            return True
+        if failure and failure.startswith("status:"):
+            status = int(failure.split(":", 1)[1])
+            return status == 429 or status >= 500
+        return False
+
+    def query(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6,
+              timeout: Optional[float] = None, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Выполнение запроса к LlamaIndex
+
+        timeout ограничивает суммарное время вызова, включая поиск рабочего endpoint.
+        fields — поля SourceNode, которые нужны вызывающему (None — все).
+        """
         try:
             payload = {
                 "query": query,
                 "top_k": top_k
             }
-            
-            # Попробуйте разные endpoint пути
-            endpoints_to_try = [
-                f"{self.base_url}/query",
-                f"{self.base_url}/chat", 
-                f"{self.base_url}/v1/query",
-                f"{self.base_url}"
-            ]
-            
-            for endpoint in endpoints_to_try:
-                try:
-                    response = requests.post(
-                        endpoint,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=30
+            if fields is not None:
+                # Сервер с поддержкой проекции не пришлёт лишнего; остальные поля отбросит разбор
+                payload["fields"] = list(fields)
+            deadline = time.monotonic() + (timeout or self.timeout)
+            failures = []
+
+            # Сначала пробуем запомненный рабочий endpoint
+            cached_endpoint = _endpoint_cache.get(self.base_url)
+            if cached_endpoint:
+                result, failure = self._post(cached_endpoint, payload, deadline - time.monotonic(), fields)
+                if result is not None:
+                    return result
+                if self._is_retryable(failure):
+                    # Недоступен сам сервер — перебор других путей ничего не даст
+                    return self._error(
+                        f"LlamaIndex API недоступен ({failure}): {self.base_url}", retryable=True
                     )
-                    
-                    if response.status_code == 200:
-                        return {
-                            "response": response.json().get("response", response.text),
-                            "source_nodes": response.json().get("source_nodes", []),
-                            "endpoint_used": endpoint
-                        }
-                        
-                except requests.exceptions.RequestException:
+                # Endpoint перестал отвечать — забываем его и ищем заново
+                with _endpoint_lock:
+                    if _endpoint_cache.get(self.base_url) == cached_endpoint:
+                        del _endpoint_cache[self.base_url]
+                failures.append(failure)
+
+            for endpoint in self._candidate_endpoints():
+                if endpoint == cached_endpoint:
                     continue
-            
-            return {
-                "error": f"Не удалось подключиться к LlamaIndex API. Проверьте URL: {self.base_url}",
-                "response": None,
-                "source_nodes": []
-            }
-            
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    failures.append("timeout")
+                    break
+                result, failure = self._post(endpoint, payload, remaining, fields)
+                if result is not None:
+                    with _endpoint_lock:
+                        _endpoint_cache[self.base_url] = endpoint
+                    return result
+                failures.append(failure)
+
+            return self._error(
+                f"Не удалось подключиться к LlamaIndex API. Проверьте URL: {self.base_url}",
+                retryable=any(self._is_retryable(f) for f in failures)
+            )
+
         except Exception as e:
-            return {
-                "error": f"Ошибка API запроса: {str(e)}",
+            return self._error(f"Ошибка API запроса: {str(e)}", retryable=False)
+
+    @staticmethod
+    def _error(message: str, retryable: bool) -> Dict[str, Any]:
+        return {
+            "error": message,
+            "retryable": retryable,
+            "response": None,
+            "source_nodes": []
+        }
+
+
+class AsyncLlamaIndexClient:
+    """Асинхронная обёртка над клиентом LlamaIndex с ограниченным параллелизмом"""
+
+    def __init__(self, client: Optional[Any] = None, max_concurrency: Optional[int] = None):
+        # Любой объект с методом query(query, top_k, similarity_threshold)
+        self.client = client or LlamaIndexClient()
+        self.max_concurrency = max_concurrency or Config.RETRIEVAL_MAX_CONCURRENCY
+        # Пул потоков ограничивает число одновременных запросов независимо от event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="llama-query"
+        )
+
+    async def aquery(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6,
+                     fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Асинхронный запрос к LlamaIndex"""
+        loop = asyncio.get_running_loop()
+        # Контекст копируется, чтобы спаны запроса относились к текущему ходу чата
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(context.run, self.client.query, query, top_k, similarity_threshold, fields=fields)
+        )
+
+    async def aquery_many(self, queries: List[str], top_k: int = 30, similarity_threshold: float = 0.6,
+                          fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Параллельное выполнение нескольких запросов; порядок результатов совпадает с queries"""
+        results = await asyncio.gather(
+            *(self.aquery(q, top_k, similarity_threshold, fields) for q in queries),
+            return_exceptions=True
+        )
+        return [
+            result if not isinstance(result, BaseException) else {
+                "error": f"Ошибка API запроса: {str(result)}",
                 "response": None,
                 "source_nodes": []
             }
+            for result in results
+        ]
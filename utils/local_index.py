@@ -0,0 +1,203 @@
+import argparse
+import json
+import mmap
+import os
+from typing import Dict, Any, List, Optional, Iterator, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from utils.source_nodes import SourceNode
+from utils.text_vectors import HashingVectorizer
+
+# Файлы индекса внутри каталога
+_META_FILE = "index.json"
+_VECTORS_FILE = "vectors.npy"
+_TEXTS_FILE = "texts.bin"
+_TEXT_OFFSETS_FILE = "text_offsets.npy"
+_METADATA_FILE = "metadata.bin"
+_METADATA_OFFSETS_FILE = "metadata_offsets.npy"
+
+
+def _iter_corpus(path: str) -> Iterator[Dict[str, Any]]:
+    """Чанки статей из JSONL: {"text": ..., "title": ..., "paper_id": ..., "year": ...}"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def build_index(corpus_path: str, index_dir: str, n_features: Optional[int] = None,
+                batch_size: int = 1024) -> int:
+    """Построение индекса из корпуса чанков ArXiv; возвращает число чанков"""
+    n_features = n_features or Config.LOCAL_INDEX_DIM
+    vectorizer = HashingVectorizer(n_features=n_features)
+    os.makedirs(index_dir, exist_ok=True)
+
+    total = sum(1 for _ in _iter_corpus(corpus_path))
+    vectors = np.lib.format.open_memmap(
+        os.path.join(index_dir, _VECTORS_FILE), mode="w+", dtype=np.float32, shape=(total, n_features)
+    )
+    text_offsets = np.zeros(total + 1, dtype=np.int64)
+    metadata_offsets = np.zeros(total + 1, dtype=np.int64)
+
+    with open(os.path.join(index_dir, _TEXTS_FILE), "wb") as texts_file, \
+            open(os.path.join(index_dir, _METADATA_FILE), "wb") as metadata_file:
+        batch: List[str] = []
+        row = 0
+        for i, chunk in enumerate(_iter_corpus(corpus_path)):
+            text = chunk.pop("text", "")
+            metadata = chunk.pop("metadata", {})
+            metadata.update(chunk)
+
+            text_bytes = text.encode("utf-8")
+            texts_file.write(text_bytes)
+            text_offsets[i + 1] = text_offsets[i] + len(text_bytes)
+
+            metadata_bytes = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+            metadata_file.write(metadata_bytes)
+            metadata_offsets[i + 1] = metadata_offsets[i] + len(metadata_bytes)
+
+            # Заголовок статьи усиливает совпадения по теме
+            batch.append(f"{metadata.get('title', '')} {text}")
+            if len(batch) == batch_size:
+                vectors[row:row + len(batch)] = vectorizer.transform_many(batch)
+                row += len(batch)
+                batch = []
+
+        if batch:
+            vectors[row:row + len(batch)] = vectorizer.transform_many(batch)
+
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(index_dir, _TEXT_OFFSETS_FILE), text_offsets)
+    np.save(os.path.join(index_dir, _METADATA_OFFSETS_FILE), metadata_offsets)
+    with open(os.path.join(index_dir, _META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"size": total, "n_features": n_features}, f)
+
+    return total
+
+
+class LocalVectorIndex:
+    """Локальный поиск по memory-mapped индексу с тем же контрактом query(), что и у LlamaIndexClient"""
+
+    def __init__(self, index_dir: Optional[str] = None, batch_rows: Optional[int] = None):
+        self.index_dir = index_dir or Config.LOCAL_INDEX_DIR
+        self.batch_rows = batch_rows or Config.LOCAL_INDEX_BATCH_ROWS
+        self.min_score = Config.LOCAL_INDEX_MIN_SCORE
+
+        with open(os.path.join(self.index_dir, _META_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        self.size = info["size"]
+        self.vectorizer = HashingVectorizer(n_features=info["n_features"])
+
+        # Ничего не загружается в память целиком: страницы подтягиваются ОС по мере чтения
+        self.vectors = np.load(os.path.join(self.index_dir, _VECTORS_FILE), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(self.index_dir, _TEXT_OFFSETS_FILE), mmap_mode="r")
+        self.metadata_offsets = np.load(os.path.join(self.index_dir, _METADATA_OFFSETS_FILE), mmap_mode="r")
+        self._texts = self._map_file(_TEXTS_FILE)
+        self._metadata = self._map_file(_METADATA_FILE)
+
+    def _map_file(self, name: str):
+        """Read-only отображение файла в память (пустой файл нельзя отобразить)"""
+        path = os.path.join(self.index_dir, name)
+        if os.path.getsize(path) == 0:
+            return b""
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _text(self, row: int) -> str:
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        return self._texts[start:end].decode("utf-8")
+
+    def _metadata_for(self, row: int) -> Dict[str, Any]:
+        start, end = int(self.metadata_offsets[row]), int(self.metadata_offsets[row + 1])
+        return json.loads(self._metadata[start:end].decode("utf-8"))
+
+    def search_batch(self, query_vectors: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k для пачки запросов: (индексы, оценки) формы (n_queries, top_k), по убыванию оценки"""
+        n_queries = query_vectors.shape[0]
+        top_k = min(top_k, self.size)
+        best_scores = np.full((n_queries, top_k), -np.inf, dtype=np.float32)
+        best_rows = np.full((n_queries, top_k), -1, dtype=np.int64)
+        if top_k == 0:
+            return best_rows, best_scores
+
+        # Проход по индексу блоками ограничивает пиковую память при любом размере корпуса
+        for start in range(0, self.size, self.batch_rows):
+            block = np.asarray(self.vectors[start:start + self.batch_rows], dtype=np.float32)
+            scores = query_vectors @ block.T
+
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_rows = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)], axis=1
+            )
+            keep = np.argpartition(-merged_scores, top_k - 1, axis=1)[:, :top_k]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _result(self, rows: np.ndarray, scores: np.ndarray,
+                fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Ответ в формате LlamaIndex API"""
+        source_nodes = []
+        excerpts = []
+        for row, score in zip(rows, scores):
+            if row < 0 or score < self.min_score:
+                continue
+            metadata = self._metadata_for(int(row))
+            node = {"score": float(score), "metadata": metadata}
+            # Текст читается из mmap, только если он нужен для выдержек или запрошен
+            if len(excerpts) < 3 or fields is None or "text" in fields:
+                node["text"] = self._text(int(row))
+            # Без LLM на стороне индекса ответом служат выдержки из лучших чанков
+            if len(excerpts) < 3:
+                excerpts.append(f"**{metadata.get('title', 'Неизвестная статья')}**: {node['text'][:500]}")
+            source_nodes.append(SourceNode.from_dict(node, fields))
+
+        return {
+            "response": "\n\n".join(excerpts),
+            "source_nodes": source_nodes,
+            "endpoint_used": f"local:{self.index_dir}"
+        }
+
+    def query(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Поиск по локальному индексу.
+
+        Оценки хэширующего векторизатора несопоставимы с оценками удалённого индекса,
+        поэтому вместо similarity_threshold применяется LOCAL_INDEX_MIN_SCORE.
+        """
+        try:
+            rows, scores = self.search_batch(self.vectorizer.transform(query)[None, :], top_k)
+            return self._result(rows[0], scores[0], fields)
+        except Exception as e:
+            return {
+                "error": f"Ошибка локального индекса: {str(e)}",
+                "response": None,
+                "source_nodes": []
+            }
+
+    def query_many(self, queries: List[str], top_k: int = 30,
+                   fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Пакетный поиск: один проход по индексу для всех запросов"""
+        rows, scores = self.search_batch(self.vectorizer.transform_many(queries), top_k)
+        return [self._result(rows[i], scores[i], fields) for i in range(len(queries))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение локального индекса чанков ArXiv")
+    parser.add_argument("corpus", help="JSONL с чанками: text, title, paper_id, year, ...")
+    parser.add_argument("index_dir", nargs="?", default=Config.LOCAL_INDEX_DIR)
+    parser.add_argument("--dim", type=int, default=Config.LOCAL_INDEX_DIM)
+    args = parser.parse_args()
+
+    total = build_index(args.corpus, args.index_dir, n_features=args.dim)
+    print(f"Проиндексировано чанков: {total} -> {args.index_dir}")
+
+
+if __name__ == "__main__":
+    main()
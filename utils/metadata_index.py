@@ -0,0 +1,257 @@
+import argparse
+import bisect
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from config import Config
+from utils.vocabulary import VOCABULARIES, extract_terms
+
+_WORD_RE = re.compile(r"\w{4,}", re.UNICODE)
+
+
+class PaperRecord:
+    """Статья в индексе метаданных"""
+
+    __slots__ = ("paper_id", "title", "year", "terms")
+
+    def __init__(self, paper_id: str, title: str, year: Optional[int], terms: Dict[str, Set[str]]):
+        self.paper_id = paper_id
+        self.title = title
+        self.year = year
+        self.terms = terms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "paper_id": self.paper_id,
+            "title": self.title,
+            "year": self.year,
+            "terms": {category: sorted(terms) for category, terms in self.terms.items() if terms}
+        }
+
+
+def _year(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class MetadataIndex:
+    """Инвертированные индексы по индикаторам, темам, рынкам и словам названий + отсортированные годы"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # True — индекс построен из полного корпуса и может отвечать на списки статей сам
+        self.complete = False
+        self.papers: Dict[str, PaperRecord] = {}
+        # категория -> термин -> paper_id
+        self._postings: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        # Параллельные отсортированные массивы для запросов по диапазону лет
+        self._years: List[int] = []
+        self._year_ids: List[str] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.papers)
+
+    def _index(self, record: PaperRecord):
+        for category, terms in record.terms.items():
+            for term in terms:
+                self._postings[category][term].add(record.paper_id)
+        if record.year is not None:
+            position = bisect.bisect_right(self._years, record.year)
+            self._years.insert(position, record.year)
+            self._year_ids.insert(position, record.paper_id)
+
+    def _unindex(self, record: PaperRecord):
+        for category, terms in record.terms.items():
+            for term in terms:
+                self._postings[category][term].discard(record.paper_id)
+        if record.year is not None:
+            start = bisect.bisect_left(self._years, record.year)
+            end = bisect.bisect_right(self._years, record.year)
+            for position in range(start, end):
+                if self._year_ids[position] == record.paper_id:
+                    del self._years[position]
+                    del self._year_ids[position]
+                    break
+
+    @staticmethod
+    def make_record(paper: Dict[str, Any]) -> Optional[PaperRecord]:
+        """Запись из dict статьи; термины берутся из готового поля terms или извлекаются из текста"""
+        # Чанки корпуса локального индекса хранят поля статьи во вложенном metadata
+        paper = {**(paper.get("metadata") or {}), **paper}
+        paper_id = paper.get("paper_id") or paper.get("title")
+        if not paper_id:
+            return None
+        title = paper.get("title") or ""
+        terms = paper.get("terms")
+        if terms is None:
+            terms = extract_terms(f"{title} {paper.get('abstract') or ''} {paper.get('text') or ''}")
+        terms = {category: set(values) for category, values in terms.items()}
+        terms["word"] = set(_WORD_RE.findall(title.lower()))
+        return PaperRecord(str(paper_id), title, _year(paper.get("year")), terms)
+
+    def add(self, paper: Dict[str, Any], persist: bool = True) -> bool:
+        """Добавление или обновление статьи; True, если индекс изменился"""
+        record = self.make_record(paper)
+        if record is None:
+            return False
+        with self._lock:
+            existing = self.papers.get(record.paper_id)
+            if existing is not None:
+                # Термины накапливаются: разные чанки статьи упоминают разное
+                for category, terms in existing.terms.items():
+                    record.terms.setdefault(category, set()).update(terms)
+                record.title = record.title or existing.title
+                record.year = record.year if record.year is not None else existing.year
+                if existing.year == record.year and existing.terms == record.terms:
+                    return False
+                self._unindex(existing)
+            self.papers[record.paper_id] = record
+            self._index(record)
+            if persist and self.path:
+                self._append(record)
+        return True
+
+    def add_many(self, papers: Iterable[Dict[str, Any]], persist: bool = True) -> int:
+        """Пакетное добавление; возвращает число изменённых статей"""
+        return sum(1 for paper in papers if self.add(paper, persist=persist))
+
+    def _append(self, record: PaperRecord):
+        """Дозапись в JSONL: инкрементальное обновление без перезаписи файла"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+
+    def _year_range(self, year_from: Optional[int], year_to: Optional[int]) -> Set[str]:
+        start = 0 if year_from is None else bisect.bisect_left(self._years, year_from)
+        end = len(self._years) if year_to is None else bisect.bisect_right(self._years, year_to)
+        return set(self._year_ids[start:end])
+
+    def candidate_ids(self, text: str = "", year_from: Optional[int] = None,
+                      year_to: Optional[int] = None) -> Optional[Set[str]]:
+        """paper_id статей, подходящих под термины текста и годы (None — фильтров нет)"""
+        terms = extract_terms(text)
+        with self._lock:
+            sets = [
+                set().union(*(self._postings[category].get(term, set()) for term in category_terms))
+                for category, category_terms in terms.items() if category_terms
+            ]
+            if year_from is not None or year_to is not None:
+                sets.append(self._year_range(year_from, year_to))
+        if not sets:
+            return None
+        # Пересечение начиная с самого маленького множества
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result = result & other
+        return result
+
+    def search(self, text: str = "", year_from: Optional[int] = None, year_to: Optional[int] = None,
+               limit: int = 20) -> List[PaperRecord]:
+        """Статьи по теме и диапазону лет: сначала больше совпавших терминов, затем новее"""
+        terms = extract_terms(text)
+        words = set(_WORD_RE.findall((text or "").lower()))
+        candidates = self.candidate_ids(text, year_from, year_to)
+
+        if not any(terms.values()) and not words and (text or "").strip():
+            # В тексте нет ни терминов словаря, ни слов для поиска по названиям («ESG», «AI»)
+            return []
+
+        with self._lock:
+            if not any(terms.values()):
+                # Термины словаря не найдены — ищем по словам названий; пустой текст — все статьи (по годам)
+                word_ids = set().union(*(self._postings["word"].get(word, set()) for word in words))
+                if candidates is None:
+                    candidates = word_ids if words else set(self.papers)
+                elif words:
+                    candidates = candidates & word_ids
+            records = [self.papers[paper_id] for paper_id in candidates if paper_id in self.papers]
+
+        def rank(record: PaperRecord):
+            matched = sum(len(record.terms.get(category, set()) & category_terms)
+                          for category, category_terms in terms.items())
+            matched += len(record.terms.get("word", set()) & words)
+            return matched, record.year or 0
+
+        records.sort(key=rank, reverse=True)
+        return records[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "papers": len(self.papers),
+                "complete": self.complete,
+                **{category: len(self._postings[category]) for category in VOCABULARIES}
+            }
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        """Загрузка из JSONL; поздние строки статьи дополняют ранние"""
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    row = json.loads(line)
+                    if "_meta" in row:
+                        index.complete = bool(row["_meta"].get("complete"))
+                    else:
+                        index.add(row, persist=False)
+        return index
+
+    def save(self, path: Optional[str] = None):
+        """Полная перезапись файла (сжатие накопленных дозаписей)"""
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"_meta": {"complete": self.complete}}) + "\n")
+            for record in self.papers.values():
+                f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+
+_shared_index: Optional[MetadataIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_metadata_index() -> MetadataIndex:
+    """Общий для процесса индекс метаданных"""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = MetadataIndex.load(Config.METADATA_INDEX_PATH)
+    return _shared_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение индекса метаданных статей")
+    parser.add_argument("corpus", help="JSONL со статьями или чанками: paper_id, title, year, text/abstract")
+    parser.add_argument("index_path", nargs="?", default=Config.METADATA_INDEX_PATH)
+    parser.add_argument("--append", action="store_true", help="Добавить к существующему индексу")
+    args = parser.parse_args()
+
+    index = MetadataIndex.load(args.index_path) if args.append else MetadataIndex(args.index_path)
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        changed = index.add_many((json.loads(line) for line in f if line.strip()), persist=False)
+    # Дополнение индекса, пополненного из выдачи поиска, не делает его полным
+    index.complete = index.complete or not args.append
+    index.save()
+    print(f"Изменено статей: {changed}, всего: {len(index)} -> {args.index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Ведро токенов: rate единиц в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._available = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Списание amount; возвращает, сколько секунд нужно подождать (0 — сразу)"""
+        # Запрос больше ёмкости иначе ждал бы вечно
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._available -= amount
+            if self._available >= 0:
+                return 0.0
+            return -self._available / self.rate
+
+
+class RateLimiter:
+    """Ограничение числа запросов и токенов в минуту (0 — без ограничения)"""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._requests: Optional[TokenBucket] = None
+        self._tokens: Optional[TokenBucket] = None
+        if requests_per_minute > 0:
+            self._requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+        if tokens_per_minute > 0:
+            self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Блокирует, пока не будет квоты на один запрос и tokens токенов; возвращает время ожидания"""
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None and tokens > 0:
+            wait = max(wait, self._tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,95 @@
+from typing import Collection, List, Optional
+
+import numpy as np
+
+from config import Config
+from utils.source_nodes import SourceNode
+from utils.text_vectors import HashingVectorizer
+from utils.tokens import count_tokens
+
+_vectorizer = HashingVectorizer(n_features=2048)
+
+
+def dedupe_by_paper(nodes: List[SourceNode]) -> List[SourceNode]:
+    """Один узел на статью (с лучшей оценкой); порядок первых появлений сохраняется"""
+    best = {}
+    for i, node in enumerate(nodes):
+        # Без paper_id статья определяется по названию, без названия узел уникален
+        key = node.paper_id or (node.title or "").strip().lower() or f"#{i}"
+        current = best.get(key)
+        if current is None or node.score > current.score:
+            best[key] = node
+    return list(best.values())
+
+
+def relevance_scores(query: str, nodes: List[SourceNode], score_weight: float,
+                     boost_ids: Optional[Collection[str]] = None, boost: float = 0.0):
+    """Смесь нормированной оценки индекса и косинусной близости запроса к названию и тексту.
+
+    Статьи из boost_ids (кандидаты индекса метаданных) получают надбавку boost.
+
+    Возвращает (оценки, матрица векторов узлов) — матрица нужна MMR.
+    """
+    matrix = _vectorizer.transform_many([f"{node.title or ''} {node.text or ''}" for node in nodes])
+    lexical = matrix @ _vectorizer.transform(query)
+
+    remote = np.array([node.score for node in nodes], dtype=np.float32)
+    spread = remote.max() - remote.min()
+    # Шкала оценок удалённого индекса неизвестна, поэтому приводим её к [0, 1]
+    remote = (remote - remote.min()) / spread if spread > 0 else np.ones_like(remote)
+
+    relevance = score_weight * remote + (1.0 - score_weight) * lexical
+    if boost_ids:
+        relevance += boost * np.array([node.paper_id in boost_ids for node in nodes], dtype=np.float32)
+    return relevance, matrix
+
+
+def mmr_order(relevance: np.ndarray, matrix: np.ndarray, k: int, mmr_lambda: float) -> List[int]:
+    """Maximal Marginal Relevance: релевантные, но непохожие на уже выбранные узлы"""
+    k = min(k, len(relevance))
+    selected: List[int] = []
+    max_similarity = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+
+    for _ in range(k):
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        # Сходство всех кандидатов с новым выбранным — одно умножение матрицы на вектор
+        max_similarity = np.maximum(max_similarity, matrix @ matrix[best])
+    return selected
+
+
+def rerank(query: str, nodes: List[SourceNode], max_nodes: Optional[int] = None,
+           token_budget: Optional[int] = None, mmr_lambda: Optional[float] = None,
+           score_weight: Optional[float] = None, boost_ids: Optional[Collection[str]] = None,
+           boost: Optional[float] = None) -> List[SourceNode]:
+    """Дедупликация по статьям, переоценка, MMR и отсечение по бюджету токенов"""
+    max_nodes = max_nodes or Config.RERANK_MAX_SOURCES
+    token_budget = token_budget or Config.RERANK_TOKEN_BUDGET
+    mmr_lambda = Config.RERANK_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    score_weight = Config.RERANK_SCORE_WEIGHT if score_weight is None else score_weight
+    boost = Config.RERANK_CANDIDATE_BOOST if boost is None else boost
+
+    nodes = dedupe_by_paper(nodes)
+    if len(nodes) <= 1:
+        return nodes
+
+    relevance, matrix = relevance_scores(query, nodes, score_weight, boost_ids, boost)
+    ordered = [nodes[i] for i in mmr_order(relevance, matrix, max_nodes, mmr_lambda)]
+
+    # Хотя бы один источник остаётся даже при очень малом бюджете
+    result = [ordered[0]]
+    used = _node_tokens(ordered[0])
+    for node in ordered[1:]:
+        used += _node_tokens(node)
+        if used > token_budget:
+            break
+        result.append(node)
+    return result
+
+
+def _node_tokens(node: SourceNode) -> int:
+    return count_tokens(node.title or "") + count_tokens(node.text or "") + 4
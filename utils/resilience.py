@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Optional, Sequence
+
+from config import Config
+from utils.tracing import tracer
+
+# Пул для попыток поиска (общий для процесса): ожидание ответа ограничено дедлайном,
+# а таймаут requests действует на каждое чтение, а не на всё потоковое тело
+_attempt_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="retrieval-attempt")
+
+
+def _timeout_error() -> Dict[str, Any]:
+    return {
+        "error": "Превышено время ожидания LlamaIndex API",
+        "retryable": True,
+        "response": None,
+        "source_nodes": []
+    }
+
+
+class CircuitBreaker:
+    """Размыкатель: после серии отказов вызовы сразу уходят на запасной путь"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or Config.CIRCUIT_RESET_TIMEOUT
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Можно ли обращаться к backend сейчас"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                # В полуоткрытом состоянии пропускается один пробный запрос
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ResilientRetriever:
+    """Поиск с дедлайном, повторами с джиттером, хеджированием и размыкателем"""
+
+    def __init__(self, client: Any, fallback: Optional[Any] = None, stale_cache: Optional[Any] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.client = client
+        # Запасные пути: устаревшая запись кэша, затем локальный индекс
+        self.fallback = fallback
+        self.stale_cache = stale_cache
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = Config.RETRIEVAL_DEADLINE
+        self.max_retries = Config.RETRIEVAL_MAX_RETRIES
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Порог для второго запроса: заданный перцентиль недавних задержек"""
+        if not Config.RETRIEVAL_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            if len(self._latencies) < Config.RETRIEVAL_HEDGE_MIN_SAMPLES:
+                return None
+            values = sorted(self._latencies)
+        index = min(len(values) - 1, int(Config.RETRIEVAL_HEDGE_PERCENTILE * len(values)))
+        return values[index]
+
+    def _attempt(self, query: str, top_k: int, similarity_threshold: float, timeout: float,
+                 fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+        """Одна попытка не дольше timeout; при превышении перцентиля отправляется дублирующий запрос"""
+        started = time.monotonic()
+        hedge_delay = self._hedge_delay()
+        primary = _attempt_executor.submit(self.client.query, query, top_k, similarity_threshold, timeout, fields)
+        pending = {primary}
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait([primary], timeout=hedge_delay)
+            if not done:
+                tracer.record("hedge", hedge_delay * 1000)
+                remaining = max(0.0, timeout - (time.monotonic() - started))
+                pending.add(_attempt_executor.submit(
+                    self.client.query, query, top_k, similarity_threshold, remaining, fields
+                ))
+
+        result = None
+        last_error = None
+        # Берём первый успешный ответ; опоздавший запрос завершится в фоне по своему таймауту
+        while pending and result is None:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate = future.result()
+                if not candidate.get("error"):
+                    result = candidate
+                    break
+                last_error = candidate
+        if result is None:
+            result = last_error or _timeout_error()
+
+        if not result.get("error"):
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _degraded(self, query: str, top_k: int, similarity_threshold: float,
+                  fields: Optional[Sequence[str]], error: Dict[str, Any]) -> Dict[str, Any]:
+        """Ответ из запасного пути или исходная ошибка"""
+        if self.stale_cache is not None:
+            from utils.retrieval_cache import make_cache_key
+
+            stale = self.stale_cache.get_stale(make_cache_key(query, top_k, similarity_threshold, fields))
+            if stale is not None:
+                stale["stale"] = True
+                return stale
+        if self.fallback is not None:
+            result = self.fallback.query(query, top_k, similarity_threshold, fields=fields)
+            if not result.get("error"):
+                result["fallback"] = True
+                return result
+        return error
+
+    def query(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Запрос с жёстким верхним пределом времени RETRIEVAL_DEADLINE"""
+        if not self.breaker.allow():
+            tracer.record("circuit_open", 0.0)
+            return self._degraded(query, top_k, similarity_threshold, fields, {
+                "error": "LlamaIndex API временно недоступен (размыкатель открыт)",
+                "retryable": True, "response": None, "source_nodes": []
+            })
+
+        deadline = time.monotonic() + self.deadline
+        result: Dict[str, Any] = {}
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            result = self._attempt(query, top_k, similarity_threshold,
+                                   min(remaining, Config.LLAMA_INDEX_TIMEOUT), fields)
+            if not result.get("error"):
+                self.breaker.record_success()
+                return result
+            if not result.get("retryable"):
+                # Ошибка конфигурации/запроса: повтор не поможет, backend при этом жив.
+                # Исход фиксируется, иначе пробный запрос полуоткрытого состояния не завершится
+                self.breaker.record_success()
+                return result
+
+            # Экспоненциальная задержка с полным джиттером, но не дольше дедлайна
+            backoff = min(Config.RETRIEVAL_BACKOFF_MAX, Config.RETRIEVAL_BACKOFF_BASE * (2 ** attempt))
+            sleep_for = min(random.uniform(0, backoff), deadline - time.monotonic())
+            if attempt < self.max_retries and sleep_for > 0:
+                tracer.record("retry", sleep_for * 1000, attempt=attempt + 1)
+                time.sleep(sleep_for)
+
+        self.breaker.record_failure()
+        if not result:
+            result = _timeout_error()
+        return self._degraded(query, top_k, similarity_threshold, fields, result)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Sequence
+
+from config import Config
+from utils.source_nodes import result_from_json, result_to_json
+from utils.tracing import tracer
+
+
+def normalize_query(query: str) -> str:
+    """Нормализация текста запроса для ключа кэша"""
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(query: str, top_k: int, similarity_threshold: float,
+                   fields: Optional[Sequence[str]] = None) -> str:
+    """Ключ кэша: нормализованный запрос + параметры поиска (и проекция полей, если задана)"""
+    raw = f"{normalize_query(query)}|{top_k}|{similarity_threshold:.4f}"
+    if fields is not None:
+        raw += "|" + ",".join(sorted(fields))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    """Персистентный LRU/TTL кэш результатов поиска на SQLite"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None):
+        self.path = path or Config.RETRIEVAL_CACHE_PATH
+        self.max_entries = max_entries or Config.RETRIEVAL_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.RETRIEVAL_CACHE_TTL
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        # Одно соединение на процесс, доступ сериализуется блокировкой
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS retrieval_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_retrieval_cache_accessed ON retrieval_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Получение результата из кэша (None при промахе или истёкшем TTL)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM retrieval_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                # Истёкшая запись остаётся как запасной ответ (get_stale) до вытеснения LRU
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE retrieval_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        return result_from_json(json.loads(value))
+
+    def get_stale(self, key: str) -> Optional[Dict[str, Any]]:
+        """Запись без учёта TTL — запасной ответ, когда backend недоступен"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM retrieval_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return result_from_json(json.loads(row[0])) if row else None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Сохранение результата с вытеснением давно не использованных записей"""
+        now = time.time()
+        payload = json.dumps(result_to_json(value), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retrieval_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    """
+                    DELETE FROM retrieval_cache WHERE key IN (
+                        SELECT key FROM retrieval_cache ORDER BY accessed_at ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._conn.execute("DELETE FROM retrieval_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика попаданий и промахов"""
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+            "max_entries": self.max_entries
+        }
+
+
+class CachedRetriever:
+    """Кэширующая обёртка с тем же контрактом query(), что и у LlamaIndexClient"""
+
+    def __init__(self, client: Any, cache: RetrievalCache):
+        self.client = client
+        self.cache = cache
+
+    def query(self, query: str, top_k: int = 30, similarity_threshold: float = 0.6,
+              fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Запрос с проверкой кэша"""
+        key = make_cache_key(query, top_k, similarity_threshold, fields)
+        started = time.perf_counter()
+        cached = self.cache.get(key)
+        tracer.record("retrieval_cache", (time.perf_counter() - started) * 1000, hit=cached is not None)
+        if cached is not None:
+            cached["cache_hit"] = True
+            return cached
+
+        result = self.client.query(query, top_k, similarity_threshold, fields=fields)
+        # Ошибки и деградированные ответы (устаревший кэш, локальный индекс) не кэшируются,
+        # иначе они получили бы полный TTL и обслуживались после восстановления API
+        if not (result.get("error") or result.get("stale") or result.get("fallback")):
+            self.cache.put(key, result)
+        return result
+
+
+_shared_cache: Optional[RetrievalCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Общий для процесса кэш (переживает перезапуски скрипта Streamlit)"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = RetrievalCache()
+    return _shared_cache
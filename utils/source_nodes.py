@@ -0,0 +1,167 @@
+from typing import Dict, Any, BinaryIO, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# Все поля компактного представления
+ALL_FIELDS = ("title", "paper_id", "year", "score", "text", "start_char", "end_char")
+# Поля, которых хватает инструментам для списка источников (без текста чанков)
+DEFAULT_FIELDS = ("title", "paper_id", "year", "score")
+
+# Где поле лежит в ответе: плоский узел API, NodeWithScore llama-index или компактный dict
+_FIELD_PATHS: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    "title": (("metadata", "title"), ("node", "metadata", "title"), ("title",)),
+    "paper_id": (
+        ("metadata", "paper_id"), ("metadata", "arxiv_id"),
+        ("node", "metadata", "paper_id"), ("node", "metadata", "arxiv_id"), ("paper_id",)
+    ),
+    "year": (("metadata", "year"), ("node", "metadata", "year"), ("year",)),
+    "score": (("score",),),
+    "text": (("text",), ("node", "text")),
+    "start_char": (("start_char_idx",), ("node", "start_char_idx"), ("start_char",)),
+    "end_char": (("end_char_idx",), ("node", "end_char_idx"), ("end_char",)),
+}
+
+
+class SourceNode:
+    """Компактный источник из ответа поиска: разбирается один раз, хранит только нужные поля"""
+
+    __slots__ = ALL_FIELDS
+
+    def __init__(self, title: Optional[str] = None, paper_id: Optional[str] = None,
+                 year: Optional[int] = None, score: float = 0.0, text: Optional[str] = None,
+                 start_char: Optional[int] = None, end_char: Optional[int] = None):
+        self.title = title
+        self.paper_id = paper_id
+        self.year = year
+        self.score = score
+        self.text = text
+        self.start_char = start_char
+        self.end_char = end_char
+
+    @classmethod
+    def from_fields(cls, values: Dict[str, Any]) -> "SourceNode":
+        """Узел из уже извлечённых значений полей с приведением типов"""
+        year = values.get("year")
+        try:
+            year = int(year) if year not in (None, "") else None
+        except (TypeError, ValueError):
+            year = None
+        paper_id = values.get("paper_id")
+        return cls(
+            title=values.get("title"),
+            paper_id=str(paper_id) if paper_id is not None else None,
+            year=year,
+            score=float(values.get("score") or 0.0),
+            text=values.get("text"),
+            start_char=_int_or_none(values.get("start_char")),
+            end_char=_int_or_none(values.get("end_char"))
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], fields: Optional[Sequence[str]] = None) -> "SourceNode":
+        """Разбор узла из JSON (формат API, llama-index или to_dict) с проекцией полей"""
+        values = {}
+        for field in fields or ALL_FIELDS:
+            for path in _FIELD_PATHS[field]:
+                value = _lookup(data, path)
+                if value is not None:
+                    values[field] = value
+                    break
+        return cls.from_fields(values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-представление без пустых полей"""
+        return {
+            field: getattr(self, field)
+            for field in ALL_FIELDS
+            if getattr(self, field) is not None
+        }
+
+    @property
+    def display_title(self) -> str:
+        return self.title or "Неизвестная статья"
+
+    def __repr__(self) -> str:
+        return f"SourceNode(title={self.title!r}, paper_id={self.paper_id!r}, year={self.year}, score={self.score:.3f})"
+
+
+def _lookup(data: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_source_nodes(nodes: Iterable[Any], fields: Optional[Sequence[str]] = None) -> List[SourceNode]:
+    """Список SourceNode из сырых узлов ответа (уже разобранные узлы проходят как есть)"""
+    return [
+        node if isinstance(node, SourceNode) else SourceNode.from_dict(node, fields)
+        for node in nodes or []
+        if isinstance(node, (SourceNode, dict))
+    ]
+
+
+def stream_prefixes(fields: Optional[Sequence[str]] = None) -> Dict[str, str]:
+    """Префиксы ijson для source_nodes.item.* -> имя поля (для потокового разбора)"""
+    return {
+        "source_nodes.item." + ".".join(path): field
+        for field in fields or ALL_FIELDS
+        for path in _FIELD_PATHS[field]
+    }
+
+
+def parse_result_stream(stream: BinaryIO, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """Потоковый разбор ответа API (ijson): в памяти остаются только запрошенные поля узлов"""
+    prefixes = stream_prefixes(fields)
+    response = ""
+    nodes: List[SourceNode] = []
+    current: Optional[Dict[str, Any]] = None
+
+    events = ijson.parse(stream)
+    first = next(events, None)
+    if first is None or first[1] != "start_map":
+        return None
+
+    for prefix, event, value in events:
+        if prefix == "response" and event == "string":
+            response = value
+        elif prefix == "source_nodes.item":
+            if event == "start_map":
+                current = {}
+            elif event == "end_map" and current is not None:
+                nodes.append(SourceNode.from_fields(current))
+                current = None
+        elif current is not None and event in ("string", "number", "boolean"):
+            field = prefixes.get(prefix)
+            # Берётся первое встреченное значение поля
+            if field is not None and field not in current:
+                current[field] = value
+
+    return {"response": response, "source_nodes": nodes}
+
+
+def result_to_json(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Результат поиска в JSON-совместимом виде (для кэша)"""
+    nodes = result.get("source_nodes") or []
+    return {
+        **result,
+        "source_nodes": [node.to_dict() if isinstance(node, SourceNode) else node for node in nodes]
+    }
+
+
+def result_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Обратное преобразование; понимает и записи в старом формате (полные узлы API)"""
+    data["source_nodes"] = parse_source_nodes(data.get("source_nodes") or [])
+    return data
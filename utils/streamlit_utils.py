@@ -1,7 +1,10 @@
 import streamlit as st
-from typing import List, Dict
-import plotly.express as px
-import pandas as pd
+from typing import List, Dict, Iterator
+
+from config import Config
+
+# Фрагмент перерисовывается отдельно от остального скрипта (в старых версиях — обычная функция)
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
 class StreamlitUtils:
     """Утилиты для улучшения интерфейса Streamlit"""
@@ -13,12 +16,35 @@ class StreamlitUtils:
             st.session_state.messages = []
         if "agent" not in st.session_state:
             st.session_state.agent = None
+        if "history_visible" not in st.session_state:
+            st.session_state.history_visible = Config.CHAT_PAGE_SIZE
     
     @staticmethod
     def display_message(message: Dict[str, str]):
         """Отображение сообщения в чате"""
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+
+    @staticmethod
+    def _show_older_messages():
+        st.session_state.history_visible += Config.CHAT_PAGE_SIZE
+
+    @staticmethod
+    @_fragment
+    def show_history():
+        """Последние сообщения чата; более ранние подгружаются порциями по кнопке"""
+        # Ответы хранятся уже отформатированными, поэтому здесь только вывод markdown,
+        # а число выводимых сообщений не растёт вместе с разговором
+        messages = st.session_state.messages
+        hidden = max(0, len(messages) - st.session_state.history_visible)
+        if hidden:
+            st.button(
+                f"⬆️ Показать более ранние сообщения ({hidden})",
+                key="show_older_messages",
+                on_click=StreamlitUtils._show_older_messages
+            )
+        for message in messages[hidden:]:
+            StreamlitUtils.display_message(message)
     
     @staticmethod
     def create_sidebar():
@@ -42,20 +68,14 @@ class StreamlitUtils:
             # Быстрые команды
             st.markdown("### 🚀 Быстрые команды")
             
-            suggestions = [
-                "вилкой в глаз или в жопу раз",
-                "куда сам сядеш а куда мать посадиш", 
-                "нормально делай нормально будет",
-                "искали искали и нашли"
-            ]
-            
-            for suggestion in suggestions:
+            for suggestion in Config.QUICK_COMMANDS:
                 if st.button(suggestion, key=f"btn_{suggestion}"):
                     return suggestion
             
             # Очистка истории
             if st.button("🗑️ Очистить историю"):
                 st.session_state.messages = []
+                st.session_state.history_visible = Config.CHAT_PAGE_SIZE
                 if st.session_state.agent:
                     st.session_state.agent.clear_history()
                 st.rerun()
@@ -64,9 +84,82 @@ class StreamlitUtils:
             with st.expander("📊 Статистика сессии"):
                 msg_count = len(st.session_state.messages)
                 st.metric("Сообщений в сессии", msg_count)
+
+                from agents.resources import get_startup_timings
+
+                timings = get_startup_timings()
+                if timings:
+                    st.caption(
+                        "Инициализация: " + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in timings.items())
+                    )
+                if st.session_state.get("agent_init_seconds") is not None:
+                    st.caption(f"Создание агента сессии: {st.session_state.agent_init_seconds:.2f} с")
+
+                # У клиента API инструментов в процессе нет
+                if getattr(st.session_state.agent, "tools", None) is not None:
+                    cache_stats = st.session_state.agent.tools.get_cache_stats()
+                    if cache_stats:
+                        st.metric(
+                            "Попаданий в кэш поиска",
+                            f"{cache_stats['hits']} / {cache_stats['hits'] + cache_stats['misses']}"
+                        )
+                    prefetcher = getattr(st.session_state.agent.tools, "prefetcher", None)
+                    if prefetcher is not None:
+                        prefetch_stats = prefetcher.stats()
+                        st.metric(
+                            "Попаданий упреждающего поиска",
+                            f"{prefetch_stats['hits']} / {prefetch_stats['issued']}"
+                        )
+                    router = getattr(st.session_state.agent, "router", None)
+                    if router is not None:
+                        router_stats = router.stats()
+                        st.metric(
+                            "Быстрый путь без ReAct",
+                            f"{router_stats['fast_path']} / {router_stats['routed']}"
+                        )
+
+            # Задержки по данным трассировки (процесс целиком)
+            with st.expander("⏱️ Задержки и токены"):
+                StreamlitUtils.show_latency_stats()
         
         return None
     
+    @staticmethod
+    def show_latency_stats():
+        """p50/p95 задержек и расход токенов из трассировки"""
+        from utils.tracing import tracer
+
+        summary = tracer.summary()
+        if not summary:
+            st.caption("Пока нет данных")
+            return
+
+        labels = {
+            "turn": "Ход чата",
+            "llm": "Вызов LLM",
+            "tool": "Инструмент",
+            "http": "HTTP к LlamaIndex",
+            "retrieval_cache": "Кэш поиска",
+            "answer_cache": "Кэш ответов"
+        }
+        rows = []
+        for name, label in labels.items():
+            stats = summary.get(name)
+            if stats:
+                rows.append(
+                    f"| {label} | {stats['count']:.0f} | {stats['p50_ms']:.0f} | {stats['p95_ms']:.0f} |"
+                )
+        st.markdown(
+            "| Этап | N | p50, мс | p95, мс |\n|---|---|---|---|\n" + "\n".join(rows)
+        )
+
+        llm_stats = summary.get("llm", {})
+        if llm_stats:
+            st.caption(
+                f"Токены: запрос {llm_stats.get('prompt_tokens', 0):.0f}, "
+                f"ответ {llm_stats.get('completion_tokens', 0):.0f}"
+            )
+    
     @staticmethod
     def show_welcome():
         """Показ приветственного сообщения"""
@@ -101,17 +194,43 @@ class StreamlitUtils:
             with st.empty():
                 st.markdown("🙊 Анализирую...")
     
+    @staticmethod
+    def render_stream(events: Iterator[Dict[str, str]]) -> str:
+        """Постепенный вывод ответа агента внутри st.chat_message; возвращает итоговый текст"""
+        status = st.status("🤔 Анализирую исследования...", expanded=False)
+        placeholder = st.empty()
+        answer = ""
+
+        for event in events:
+            if event["type"] == "step":
+                status.markdown(event["content"])
+            elif event["type"] == "token":
+                answer += event["content"]
+                placeholder.markdown(answer + "▌")
+            elif event["type"] == "done":
+                answer = event["content"]
+            elif event["type"] == "error":
+                status.update(label="❌ Ошибка", state="error")
+                placeholder.error(event["content"])
+                return f"❌ {event['content']}"
+
+        status.update(label="✅ Анализ завершён", state="complete")
+        formatted_response = StreamlitUtils.format_agent_response(answer)
+        placeholder.markdown(formatted_response)
+        return formatted_response
+    
     @staticmethod
     def format_agent_response(response: str) -> str:
         """Форматирование ответа агента"""
-        # Добавляем эмодзи для лучшего восприятия
-        if "стратег" in response.lower():
+        # Добавляем эмодзи для лучшего восприятия (вызывается один раз на ответ)
+        lowered = response.lower()
+        if "стратег" in lowered:
             response = "📈 " + response
-        elif "исследован" in response.lower():
+        elif "исследован" in lowered:
             response = "🔬 " + response  
-        elif "сравнен" in response.lower():
+        elif "сравнен" in lowered:
             response = "⚖️ " + response
-        elif "ошибка" in response.lower():
+        elif "ошибка" in lowered:
             response = "❌ " + response
         
         return response
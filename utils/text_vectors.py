@@ -0,0 +1,46 @@
+import re
+import zlib
+from typing import List, Iterable
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingVectorizer:
+    """Офлайн векторизатор: хэширование слов и символьных n-грамм в вектор фиксированной длины"""
+
+    def __init__(self, n_features: int = 4096, ngram_range: tuple = (3, 4)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> Iterable[str]:
+        """Слова и символьные n-граммы внутри слов"""
+        min_n, max_n = self.ngram_range
+        for word in _WORD_RE.findall(text.lower()):
+            yield "w:" + word
+            padded = f"#{word}#"
+            for n in range(min_n, max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n]
+
+    def transform(self, text: str) -> np.ndarray:
+        """Нормированный (L2) вектор текста"""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 стабилен между процессами, в отличие от hash()
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.n_features] += sign
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def transform_many(self, texts: List[str]) -> np.ndarray:
+        """Матрица векторов (по строке на текст)"""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.transform(text)
+        return matrix
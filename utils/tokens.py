@@ -0,0 +1,38 @@
+import functools
+from typing import Optional
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """Токенизатор загружается один раз на процесс (tiktoken входит в зависимости llama-index)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Число токенов в тексте (без tiktoken — оценка ~4 символа на токен)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: Optional[str] = "…") -> str:
+    """Обрезка текста до max_tokens токенов"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _get_encoding()
+    if encoding is None:
+        truncated = text[:max_tokens * 4]
+    else:
+        truncated = encoding.decode(encoding.encode(text)[:max_tokens])
+    return truncated + (suffix or "")
@@ -0,0 +1,184 @@
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+from config import Config
+
+# Идентификатор текущего хода чата (наследуется спанами этого хода)
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("current_turn", default=None)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Tracer:
+    """Структурные спаны по ходам чата с экспортом в JSONL и Prometheus text format"""
+
+    def __init__(self, trace_path: Optional[str] = None, metrics_path: Optional[str] = None,
+                 window: int = 1000):
+        self.trace_path = trace_path or Config.TRACE_PATH
+        self.metrics_path = metrics_path or Config.METRICS_PATH
+        self.enabled = Config.TRACING_ENABLED
+        self.max_bytes = Config.TRACE_MAX_BYTES
+        self.backups = Config.TRACE_BACKUPS
+
+        # Последние длительности (мс) по имени спана — для p50/p95
+        self._durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _write(self, record: Dict[str, Any]):
+        if self._file is None:
+            directory = os.path.dirname(self.trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.trace_path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Сдвиг traces.jsonl -> .1 -> .2 ...; самый старый файл удаляется, текущий открывается заново (под блокировкой)"""
+        self._file.close()
+        self._file = None
+        if self.backups <= 0:
+            os.remove(self.trace_path)
+        else:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.trace_path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.trace_path}.{index + 1}")
+            os.replace(self.trace_path, f"{self.trace_path}.1")
+        self._file = open(self.trace_path, "a", encoding="utf-8")
+
+    def record(self, name: str, duration_ms: float, turn_id: Optional[str] = None, **attrs):
+        """Запись завершённого спана"""
+        if not self.enabled:
+            return
+        record = {
+            "ts": time.time(),
+            "name": name,
+            "turn_id": turn_id or _current_turn.get(),
+            "duration_ms": round(duration_ms, 3),
+            **attrs
+        }
+        with self._lock:
+            self._durations[name].append(duration_ms)
+            self._counters[f"{name}_count"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "bytes"):
+                if attrs.get(key):
+                    self._counters[f"{name}_{key}"] += attrs[key]
+            if "hit" in attrs:
+                self._counters[f"{name}_{'hits' if attrs['hit'] else 'misses'}"] += 1
+            try:
+                self._write(record)
+            except OSError as e:
+                print(f"Ошибка записи трассировки: {e}")
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Спан вокруг блока кода; в yield-нутый словарь можно дописать атрибуты"""
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = str(e)
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, **attrs)
+
+    @contextmanager
+    def turn(self, **attrs):
+        """Ход чата: новый turn_id для всех вложенных спанов"""
+        token = _current_turn.set(uuid.uuid4().hex[:12])
+        try:
+            with self.span("turn", **attrs) as turn_attrs:
+                yield turn_attrs
+        finally:
+            _current_turn.reset(token)
+            self.flush()
+
+    def flush(self):
+        """Сброс JSONL и перезапись файла метрик Prometheus"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        try:
+            self.write_prometheus()
+        except OSError as e:
+            print(f"Ошибка записи метрик: {e}")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95 длительностей и счётчики по каждому типу спанов"""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            counters = dict(self._counters)
+
+        result = {}
+        for name, values in durations.items():
+            stats = {
+                "count": counters.get(f"{name}_count", 0),
+                "p50_ms": _percentile(values, 0.5),
+                "p95_ms": _percentile(values, 0.95)
+            }
+            for key in ("prompt_tokens", "completion_tokens", "bytes", "hits", "misses"):
+                if f"{name}_{key}" in counters:
+                    stats[key] = counters[f"{name}_{key}"]
+            result[name] = stats
+        return result
+
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        for name, stats in self.summary().items():
+            metric = f"finance_agent_{name}"
+            lines.append(f"# TYPE {metric}_duration_ms summary")
+            lines.append(f'{metric}_duration_ms{{quantile="0.5"}} {stats["p50_ms"]:.3f}')
+            lines.append(f'{metric}_duration_ms{{quantile="0.95"}} {stats["p95_ms"]:.3f}')
+            lines.append(f"{metric}_duration_ms_count {stats['count']:.0f}")
+            for key in ("prompt_tokens", "completion_tokens", "bytes", "hits", "misses"):
+                if key in stats:
+                    lines.append(f"# TYPE {metric}_{key}_total counter")
+                    lines.append(f"{metric}_{key}_total {stats[key]:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Файл метрик для node_exporter textfile collector"""
+        text = self.render_prometheus()
+        directory = os.path.dirname(self.metrics_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Атомарная замена, чтобы сборщик не прочитал недописанный файл;
+        # у каждого вызова свой временный файл — параллельные ходы не пишут в один
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory or ".",
+                                         prefix=".metrics-", suffix=".tmp", delete=False) as f:
+            f.write(text)
+        try:
+            # NamedTemporaryFile создаётся с правами 0600, а файл читает node_exporter
+            os.chmod(f.name, 0o644)
+            os.replace(f.name, self.metrics_path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+
+def current_turn_id() -> Optional[str]:
+    """turn_id текущего хода (None вне хода)"""
+    return _current_turn.get()
+
+
+tracer = Tracer()
@@ -0,0 +1,112 @@
+import re
+from typing import Dict, List, Set
+
+# Канонический термин -> варианты написания (регулярные выражения, без учёта регистра).
+# Русские варианты заданы основами, чтобы покрыть падежные формы.
+INDICATORS: Dict[str, List[str]] = {
+    "rsi": [r"rsi", r"relative strength index", r"индекс относительной силы"],
+    "macd": [r"macd"],
+    "bollinger_bands": [r"bollinger\w*", r"боллинджер\w*"],
+    "moving_average": [r"moving averages?", r"sma", r"ema", r"скользящ\w+ средн\w+"],
+    "stochastic": [r"stochastic\w*", r"стохастик\w*"],
+    "atr": [r"atr", r"average true range"],
+    "adx": [r"adx", r"directional movement"],
+    "obv": [r"obv", r"on[- ]balance volume"],
+    "vwap": [r"vwap"],
+    "ichimoku": [r"ichimoku", r"ишимоку"],
+    "fibonacci": [r"fibonacci", r"фибоначчи"],
+}
+
+TOPICS: Dict[str, List[str]] = {
+    "momentum": [r"momentum", r"моментум\w*", r"импульс\w*"],
+    "mean_reversion": [r"mean[- ]reversion", r"возврат\w* к среднему"],
+    "trend_following": [r"trend[- ]following", r"следовани\w+ за трендом"],
+    "pairs_trading": [r"pairs? trading", r"статистическ\w+ арбитраж\w*", r"statistical arbitrage"],
+    "machine_learning": [r"machine learning", r"deep learning", r"neural networks?", r"reinforcement learning",
+                         r"машинн\w+ обучени\w*", r"нейросет\w*", r"нейронн\w+ сет\w*"],
+    "behavioral_finance": [r"behaviou?ral finance", r"поведенческ\w+ финанс\w*"],
+    "algorithmic_trading": [r"algorithmic trading", r"algo[- ]trading", r"алгоритмическ\w+"],
+    "high_frequency": [r"high[- ]frequency", r"hft", r"высокочастотн\w+"],
+    "sentiment": [r"sentiment", r"сентимент\w*", r"настроени\w+ рынка"],
+    "portfolio": [r"portfolio optimi[sz]ation", r"asset allocation", r"портфел\w+"],
+    "risk_management": [r"risk management", r"value at risk", r"var", r"drawdown", r"управлени\w+ риск\w*"],
+    "volatility_modeling": [r"garch", r"volatility forecasting", r"прогноз\w* волатильност\w*"],
+    "contrarian": [r"contrarian", r"контрариан\w*"],
+}
+
+MARKETS: Dict[str, List[str]] = {
+    "trending": [r"trending", r"trend market", r"трендов\w+"],
+    "sideways": [r"sideways", r"range[- ]bound", r"ranging", r"флэт\w*", r"боков\w+"],
+    "volatile": [r"volatile", r"high volatility", r"волатильн\w+"],
+    "bull": [r"bull(?:ish)? markets?", r"бычь\w+"],
+    "bear": [r"bear(?:ish)? markets?", r"медвеж\w+"],
+    "crisis": [r"crisis", r"crash\w*", r"кризис\w*"],
+    "crypto": [r"crypto\w*", r"bitcoin", r"криптовалют\w*", r"биткоин\w*"],
+    "forex": [r"forex", r"fx", r"currenc\w+", r"валютн\w+"],
+    "equities": [r"equit\w+", r"stocks?", r"stock market", r"акци\w+", r"фондов\w+"],
+    "commodities": [r"commodit\w+", r"futures", r"сырьев\w+", r"фьючерс\w*"],
+}
+
+# Горизонт торговли (аргумент timeframe инструментов); в индекс метаданных не входит
+TIMEFRAMES: Dict[str, List[str]] = {
+    "intraday": [r"дневн\w*", r"интрадей\w*", r"внутридневн\w*", r"intraday", r"day trading",
+                 r"скальп\w*", r"scalp\w*"],
+    "swing": [r"свинг\w*", r"swing", r"среднесрочн\w*"],
+    "weekly": [r"недельн\w*", r"weekly"],
+    "monthly": [r"месячн\w*", r"monthly"],
+    "long-term": [r"долгосрочн\w*", r"long[- ]term", r"позиционн\w*"],
+}
+
+# Отрицания меняют смысл вопроса при почти том же наборе слов
+NEGATION_RE = re.compile(r"(?<!\w)(?:не|нет|без|кроме|not|no|without|except)(?!\w)", re.IGNORECASE | re.UNICODE)
+
+# Признаки просьбы сравнить (агент, скорее всего, вызовет compare_strategies)
+COMPARE_RE = re.compile(r"сравн\w*|compar\w*|(?<!\w)vs\.?(?!\w)|против", re.IGNORECASE | re.UNICODE)
+
+VOCABULARIES: Dict[str, Dict[str, List[str]]] = {
+    "indicator": INDICATORS,
+    "topic": TOPICS,
+    "market": MARKETS,
+}
+
+
+def _compile(vocabulary: Dict[str, List[str]]) -> List:
+    return [
+        (term, re.compile(r"(?<!\w)(?:" + "|".join(aliases) + r")(?!\w)", re.IGNORECASE | re.UNICODE))
+        for term, aliases in vocabulary.items()
+    ]
+
+
+# Шаблоны компилируются один раз при импорте
+_PATTERNS = {category: _compile(vocabulary) for category, vocabulary in VOCABULARIES.items()}
+
+
+_TIMEFRAME_PATTERNS = _compile(TIMEFRAMES)
+
+
+def extract_timeframes(text: str) -> List[str]:
+    """Горизонты торговли в порядке упоминания"""
+    text = text or ""
+    matches = [(term, pattern.search(text)) for term, pattern in _TIMEFRAME_PATTERNS]
+    return [term for term, match in sorted((item for item in matches if item[1]), key=lambda item: item[1].start())]
+
+
+def extract_terms(text: str) -> Dict[str, Set[str]]:
+    """Канонические термины текста по категориям: indicator, topic, market"""
+    text = text or ""
+    return {
+        category: {term for term, pattern in patterns if pattern.search(text)}
+        for category, patterns in _PATTERNS.items()
+    }
+
+
+def extract_ordered_terms(text: str) -> Dict[str, List[str]]:
+    """Канонические термины по категориям в порядке первого упоминания"""
+    text = text or ""
+    ordered = {}
+    for category, patterns in _PATTERNS.items():
+        matches = [(term, pattern.search(text)) for term, pattern in patterns]
+        ordered[category] = [term for term, match in sorted(
+            (item for item in matches if item[1]), key=lambda item: item[1].start()
+        )]
+    return ordered